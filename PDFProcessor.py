@@ -1,17 +1,291 @@
 #excel conversion working good 3 version with detection of horizontal line wokring PERFECT TO SUBMIT
 
 import fitz
+import gc
 import re
-import pandas as pd
-from openpyxl.styles import Font, Alignment
+import numpy as np
 import os
 import logging
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from writers import get_writer
+from instrumentation import ProcessingStats, current_rss
+
+# Bump when a change alters the rows produced for the same PDF
+PROCESSOR_VERSION = "2.4"
+
+# Bounded-memory mode relieves memory at most once per this many pages, as freed
+# memory is not always returned to the OS straight away
+MEMORY_RELIEF_INTERVAL = 25
+
+# A footnote line below the separator: its number, whitespace, then the text
+FOOTNOTE_START = re.compile(r"(\d+)\s+(.*)")
+
+# Fallback for footnotes the layout pass missed: a number followed by text up to the next digit
+NUMBERED_TEXT = re.compile(r"(?<!\d)(\d+)\s+([^0-9]+?)(?=\d|$)", re.DOTALL)
+
+def select_pages(pages, page_count):
+    """0-based page numbers, in document order, for a selection of 1-based pages
+
+    pages is None for every page, a string of comma separated pages and
+    ranges such as "1-5, 8, 10-" (a range may be open at either end), or an
+    iterable of page numbers such as [3, 7] or range(10, 20).
+    """
+    if pages is None:
+        return list(range(page_count))
+
+    selected = set()
+    if isinstance(pages, str):
+        for part in pages.split(","):
+            part = part.strip()
+            if not part:
+                continue
+            first, dash, last = part.partition("-")
+            try:
+                first = int(first) if first.strip() else 1
+                last = (int(last) if last.strip() else page_count) if dash else first
+            except ValueError:
+                raise ValueError(f"Invalid page range {part!r}, expected e.g. 1-5, 8, 10-") from None
+            if first < 1 or last > page_count or first > last:
+                raise ValueError(f"Page range {part!r} is outside pages 1-{page_count}")
+            selected.update(range(first - 1, last))
+    else:
+        for number in pages:
+            if not isinstance(number, int):
+                raise ValueError(f"Invalid page number {number!r}, expected a whole number")
+            if not 1 <= number <= page_count:
+                raise ValueError(f"Page {number} is outside pages 1-{page_count}")
+            selected.add(number - 1)
+
+    if not selected:
+        raise ValueError("No pages selected")
+    return sorted(selected)
+
+def page_label(label_rules, page_num):
+    """Label of a 0-based page from the document's page label rules, else its 1-based number, as a string"""
+    rules = [rule for rule in label_rules if rule["startpage"] <= page_num]
+    if rules:
+        rule = max(rules, key=lambda rule: rule["startpage"])
+        style = rule.get("style", "")
+        # Letter styles count from 0, so "a" is the first label
+        number = page_num - rule["startpage"] + rule.get("firstpagenum", 1) - (style in ("a", "A"))
+        label = fitz.utils.construct_label(style, rule.get("prefix", ""), number)
+        if label:
+            return label
+    return str(page_num + 1)
+
+class PageLayout:
+    """Parsed text layout of a single page, extracted once and shared by every stage"""
+    def __init__(self, page):
+        self.page = page
+        self.width = page.rect.width
+        self.height = page.rect.height
+
+        # Single text extraction for the page, kept only in the compact span model
+        self.blocks = [Block.from_dict(block) for block in page.get_text("dict")["blocks"]]
+        self._text = None
+        self._geometry = None
+        self._font_stats = None
+
+    @property
+    def geometry(self):
+        """Span and block geometry as NumPy arrays, built on first use"""
+        if self._geometry is None:
+            self._geometry = SpanGeometry(self.blocks)
+        return self._geometry
+
+    @property
+    def font_stats(self):
+        """Body-text font statistics of the page, computed once on first use"""
+        if self._font_stats is None:
+            self._font_stats = FontStatistics(self.geometry)
+        return self._font_stats
+
+    @property
+    def text(self):
+        """Plain page text, derived from the dict layout instead of a second get_text() call"""
+        if self._text is None:
+            lines = []
+            for block in self.blocks:
+                for line in block.lines:
+                    lines.append("".join(span.text for span in line) + "\n")
+            self._text = "".join(lines)
+        return self._text
+
+class Span:
+    """Text span with only the fields the pipeline uses"""
+    __slots__ = ("text", "size", "bbox", "flags")
+
+    def __init__(self, text, size, bbox, flags):
+        self.text = text
+        self.size = size
+        self.bbox = bbox
+        self.flags = flags
+
+class Block:
+    """Text block: its bounding box and lines, each line a list of Span"""
+    __slots__ = ("bbox", "lines")
+
+    def __init__(self, bbox, lines):
+        self.bbox = bbox
+        self.lines = lines
+
+    @classmethod
+    def from_dict(cls, block):
+        """Convert a get_text("dict") block, dropping fonts, colors, origins and image data"""
+        return cls(tuple(block["bbox"]), [
+            [Span(span["text"], span["size"], tuple(span["bbox"]), span["flags"])
+             for span in line.get("spans", [])]
+            for line in block.get("lines", [])
+        ])
+
+class SpanGeometry:
+    """Flattened span geometry of a page, for batched position and font-size tests
+
+    spans[i] is the i-th span in reading order; span_block[i] and span_line[i]
+    index its block and its line (numbered across the whole page).
+    """
+    def __init__(self, blocks):
+        self.spans = []
+        span_block = []
+        span_line = []
+        sizes = []
+        is_digit = []
+        flags = []
+        top = []
+        bottom = []
+
+        line_index = 0
+        for block_index, block in enumerate(blocks):
+            for line in block.lines:
+                for span in line:
+                    self.spans.append(span)
+                    span_block.append(block_index)
+                    span_line.append(line_index)
+                    sizes.append(span.size)
+                    is_digit.append(span.text.strip().isdigit())
+                    flags.append(span.flags)
+                    top.append(span.bbox[1])
+                    bottom.append(span.bbox[3])
+                line_index += 1
+
+        self.line_count = line_index
+        self.block_y = np.array([block.bbox[1] for block in blocks], dtype=float)
+        self.span_block = np.array(span_block, dtype=np.intp)
+        self.span_line = np.array(span_line, dtype=np.intp)
+        self.size = np.array(sizes, dtype=float)
+        self.is_digit = np.array(is_digit, dtype=bool)
+        self.is_superscript = (np.array(flags, dtype=np.int64) & fitz.TEXT_FONT_SUPERSCRIPT) != 0
+        self.top = np.array(top, dtype=float)
+        self.bottom = np.array(bottom, dtype=float)
+
+class FontStatistics:
+    """Body-text font sizes of a page, per line and per block
+
+    Digit-only spans are left out, since they are the candidate references.
+    body_size[i] is the size span i is compared against: its line's average
+    body size. A digit span on a line with no body text, such as a
+    superscript MuPDF put on a line of its own, is compared against its
+    block's body size only if it is flagged as a superscript or sits raised
+    beside body text in the block. Other digit-only lines (table columns,
+    axis ticks, page numbers) have no body size and never count as smaller.
+    is_smaller[i] tells whether span i is set smaller than its body size.
+    """
+    SMALLER_FONT_RATIO = 0.85  # Slightly more lenient threshold
+    RAISED_BASELINE = 1.0  # Points a superscript's bottom sits above the body text beside it
+
+    def __init__(self, geometry):
+        is_body = ~geometry.is_digit
+        body_sizes = np.where(is_body, geometry.size, 0.0)
+
+        self.line_avg = self._group_average(geometry.span_line, body_sizes, is_body, geometry.line_count)
+        self.block_avg = self._group_average(geometry.span_block, body_sizes, is_body, len(geometry.block_y))
+
+        self.body_size = self.line_avg[geometry.span_line]
+        for index in np.flatnonzero(np.isnan(self.body_size) & geometry.is_digit):
+            if geometry.is_superscript[index] or self._is_raised(geometry, is_body, index):
+                self.body_size[index] = self.block_avg[geometry.span_block[index]]
+        # NaN body sizes compare False, so spans without one are never smaller
+        self.is_smaller = geometry.size < self.body_size * self.SMALLER_FONT_RATIO
+
+    @classmethod
+    def _is_raised(cls, geometry, is_body, index):
+        """Whether a span sits above the baseline of body text beside it in the same block"""
+        beside = (is_body & (geometry.span_block == geometry.span_block[index])
+                  & (geometry.top < geometry.bottom[index]) & (geometry.bottom > geometry.top[index]))
+        return bool(np.any(geometry.bottom[beside] - geometry.bottom[index] > cls.RAISED_BASELINE))
+
+    @staticmethod
+    def _group_average(groups, values, counted, group_count):
+        """Average of values per group over the counted entries, NaN for groups with none"""
+        total = np.bincount(groups, weights=values, minlength=group_count)
+        count = np.bincount(groups, weights=counted, minlength=group_count)
+        return np.divide(total, count, out=np.full(group_count, np.nan), where=count > 0)
+
+class FootnoteRow(namedtuple("FootnoteRow", ["page", "content", "footnote_number", "footnote_text"])):
+    """One output row: body text, a footnote or a page marker, tagged with its page label"""
+    __slots__ = ()
+
+    @classmethod
+    def from_excel_row(cls, page, content, footnote):
+        """Build a record from a [Content, Footnotes] row; footnote cells read N. text"""
+        if footnote:
+            number, _, text = footnote.partition(". ")
+            # Reference spans can carry surrounding whitespace, e.g. ' 6'
+            return cls(page, content, number.strip(), text)
+        return cls(page, content, "", "")
+
+    def to_excel_row(self):
+        """[Content, Footnotes] cells as written to the workbook"""
+        if self.footnote_number:
+            return [self.content, f"{self.footnote_number}. {self.footnote_text}"]
+        return [self.content, ""]
+
+class ProgressReport(namedtuple("ProgressReport", ["pages_done", "page_count", "elapsed", "pages_per_sec", "eta"])):
+    """Snapshot of a run's progress, passed to the progress callback after every page"""
+    __slots__ = ()
+
+    def to_dict(self):
+        """Plain dict for job stores and metrics exporters"""
+        return self._asdict()
 
 class PDFProcessor:
-    def __init__(self):
+    def __init__(self, workers=1, stream_output=False, page_cache=None, progress_callback=None,
+                 preview_size=10, stats_path=None, debug=False, memory_limit_mb=None):
         self.excel_data = []
-        self.current_page = 2
-        logging.basicConfig(level=logging.DEBUG)
+        # 1-based number of the page being processed, for log messages
+        self.current_page = 1
+        # Page label rules of the document being processed (doc.get_page_labels())
+        self.label_rules = []
+        # Page count of that document and the 0-based pages selected for the run
+        self.document_page_count = 0
+        self.page_numbers = []
+        # Number of worker processes for process_pdf; None uses all CPU cores
+        self.workers = workers or os.cpu_count() or 1
+        # Write rows to the workbook as pages finish instead of holding them all
+        self.stream_output = stream_output
+        self.writer = None
+        # Optional result_cache.PageCache so unchanged pages are not reprocessed
+        self.page_cache = page_cache
+        # Called with a ProgressReport after every page
+        self.progress_callback = progress_callback
+        # First rows of the last run, kept so callers can preview without reading the output back
+        self.preview_size = preview_size
+        self.preview_rows = []
+        # Timings and counters of the last run; dumped to stats_path (.json or .prom) if set
+        self.stats = ProcessingStats()
+        self.stats_path = stats_path
+        # Opt-in per-page diagnostics (footnotes, references, matching warnings)
+        self.debug = debug
+        self.debug_report = []
+        # Which tier found the footnote boundary of the last page: "text", "separator" or "none"
+        self.last_boundary = None
+        # Bounded-memory mode: soft RSS limit per process, past which MuPDF caches are
+        # dropped and the document reopened. Rows are always streamed in this mode.
+        self.memory_limit_mb = memory_limit_mb
+        if memory_limit_mb:
+            self.stream_output = True
         self.logger = logging.getLogger(__name__)
 
 
@@ -21,32 +295,27 @@ class PDFProcessor:
         page_width = page.rect.width
         page_height = page.rect.height
 
-        # Get all drawings from the page
-        paths = page.get_drawings()
-        horizontal_lines = []
-
-        for path in paths:
-            # Check if it's a line
-            if 'rect' in path:
-                rect = path['rect']
-                y0, y1 = rect[1], rect[3]
-                x0, x1 = rect[0], rect[2]
-
-                # Check if it's horizontal (y coordinates are close)
-                if abs(y1 - y0) < 2:  # Allow small deviation
-                    # Check if line is in bottom third of page
-                    if y0 > (page_height * 0.6):
-                        # Check if line length is appropriate (25-35% of page width)
-                        line_length = x1 - x0
-                        length_ratio = line_length / page_width
-
-                        if 0.25 <= length_ratio <= 0.35:
-                            horizontal_lines.append({
-                                'bbox': (x0, y0, x1, y1),
-                                'is_separator': True
-                            })
-
-        self.logger.debug(f"Page {self.current_page}: Found {len(horizontal_lines)} horizontal lines")
+        # Get all drawings from the page; get_cdrawings skips building Rect/Point objects
+        get_drawings = getattr(page, "get_cdrawings", page.get_drawings)
+        paths = get_drawings()
+
+        # Classify every path at once on an (N, 4) array of x0, y0, x1, y1
+        rects = np.array([tuple(path['rect']) for path in paths if 'rect' in path], dtype=float).reshape(-1, 4)
+        x0, y0, x1, y1 = rects.T
+        length_ratio = (x1 - x0) / page_width
+        is_separator = (
+            (np.abs(y1 - y0) < 2)              # Horizontal, allowing small deviation
+            & (y0 > page_height * 0.6)         # In bottom part of page
+            & (length_ratio >= 0.25)           # 25-35% of page width
+            & (length_ratio <= 0.35)
+        )
+
+        horizontal_lines = [
+            {'bbox': tuple(rect), 'is_separator': True}
+            for rect in rects[is_separator].tolist()
+        ]
+
+        self.logger.debug("Page %d: Found %d horizontal lines", self.current_page, len(horizontal_lines))
         return horizontal_lines
 
     def validate_footnote_format(self, text):
@@ -59,7 +328,7 @@ class PDFProcessor:
         """Find and validate footnote section"""
         lines = self.find_horizontal_lines(page)
         if not lines:
-            self.logger.debug(f"Page {self.current_page}: No horizontal lines found")
+            self.logger.debug("Page %d: No horizontal lines found", self.current_page)
             return None
 
         # Sort lines by y-position (bottom to top)
@@ -82,38 +351,66 @@ class PDFProcessor:
 
         return None
 
+    def footnotes_below(self, layout, section_start):
+        """Collect numbered footnotes from the lines below a separator, keyed by number
 
-
-    def extract_footnotes_and_refs(self, page):
+        A line starting with a number followed by whitespace starts a footnote
+        (the format validate_footnote_format accepts); other lines continue it.
+        """
+        footnotes = {}
+        current_num = None
+        blocks = sorted((block for block in layout.blocks if block.bbox[1] >= section_start),
+                        key=lambda block: block.bbox[1])
+        for block in blocks:
+            for line in block.lines:
+                line_text = " ".join(span.text.strip() for span in line if span.text.strip())
+                match = FOOTNOTE_START.match(line_text)
+                if match:
+                    current_num, line_text = match.groups()
+                if current_num is None or not line_text:
+                    continue
+                footnotes[current_num] = f"{footnotes.get(current_num, '')} {line_text}".strip()
+        return footnotes
+
+    def extract_footnotes_and_refs(self, page, layout=None):
         """Enhanced footnote extraction with improved detection"""
         footnotes = {}
         main_footnote_refs = []
         footnote_markers = []
 
+        if layout is None:
+            with self.stats.timer("text_extraction"):
+                layout = PageLayout(page)
+        detect_start = time.perf_counter()
+
         # Get page dimensions for position analysis
-        page_height = page.rect.height
-        page_width = page.rect.width
+        page_height = layout.height
+        page_width = layout.width
 
         # Get all blocks of text
-        blocks = page.get_text("dict")["blocks"]
+        blocks = layout.blocks
 
         # First pass: Identify all potential references in the main text
+        # (number in a smaller font), testing every span of the page at once
+        geometry = layout.geometry
+        span_count = len(geometry.spans)
+        is_ref = geometry.is_digit & layout.font_stats.is_smaller
+        is_main_text = geometry.block_y[geometry.span_block] < (page_height * 0.7)  # Consider position on page
+
         potential_refs = []
-        for block in blocks:
-            block_y = block["bbox"][1]  # Y-position of block
+        for index in np.flatnonzero(is_ref):
+            span = geometry.spans[index]
 
-            for line in block.get("lines", []):
-                for span in line.get("spans", []):
-                    # Check if span could be a reference (number and smaller font)
-                    if (span["text"].strip().isdigit() and
-                        self.is_smaller_font(span, line.get("spans", []))):
+            # Store reference with its position
+            potential_refs.append({
+                "text": span.text,
+                "y_pos": span.bbox[1],
+                "is_main_text": bool(is_main_text[index]),
+                "span": span
+            })
 
-                        # Store reference with its position
-                        potential_refs.append({
-                            "text": span["text"],
-                            "y_pos": span["bbox"][1],
-                            "is_main_text": block_y < (page_height * 0.7)  # Consider position on page
-                        })
+        # Index reference numbers once so span matching is a set lookup
+        ref_numbers = {ref["text"] for ref in potential_refs}
 
         # Second pass: Find footnotes by looking for numbered text at bottom of page
         footnote_section_started = False
@@ -121,25 +418,25 @@ class PDFProcessor:
         current_footnote_num = None
         last_y_position = 0
 
-        # Sort blocks by vertical position
-        sorted_blocks = sorted(blocks, key=lambda x: x["bbox"][1])
+        # Sort blocks by vertical position and classify the bottom zone up front
+        in_bottom_zone = geometry.block_y > (page_height * 0.6)
 
-        for block in sorted_blocks:
-            block_y = block["bbox"][1]
+        for block_index in np.argsort(geometry.block_y, kind="stable"):
+            block = blocks[block_index]
             block_text = ""
 
             # Combine all text in block
-            for line in block.get("lines", []):
-                for span in line.get("spans", []):
-                    span_text = span["text"].strip()
+            for line in block.lines:
+                for span in line:
+                    span_text = span.text.strip()
 
                     # Check if this might be a footnote number
                     if (span_text.isdigit() and
-                        block_y > (page_height * 0.6) and  # In bottom portion of page
+                        in_bottom_zone[block_index] and  # In bottom portion of page
                         not current_footnote_num):
 
                         # Verify this number exists in our references
-                        if any(ref["text"] == span_text for ref in potential_refs):
+                        if span_text in ref_numbers:
                             current_footnote_num = span_text
                             footnote_section_started = True
                             continue
@@ -149,7 +446,7 @@ class PDFProcessor:
 
                     # Check for next footnote number
                     if (current_footnote and span_text.isdigit() and
-                        any(ref["text"] == span_text for ref in potential_refs)):
+                        span_text in ref_numbers):
                         if current_footnote_num:
                             footnotes[current_footnote_num] = current_footnote.strip()
                         current_footnote_num = span_text
@@ -166,66 +463,81 @@ class PDFProcessor:
         # Separate references into main text refs and footnote markers
         for ref in potential_refs:
             if ref["is_main_text"]:
-                # Find the span in original blocks
-                for block in blocks:
-                    for line in block.get("lines", []):
-                        for span in line.get("spans", []):
-                            if span["text"] == ref["text"] and ref["is_main_text"]:
-                                main_footnote_refs.append(span)
+                # Keep the span the reference was detected on
+                main_footnote_refs.append(ref["span"])
             else:
                 footnote_markers.append(ref)
 
         # Validation: Check if we found footnotes for all references
         missing_footnotes = []
         for ref in main_footnote_refs:
-            if ref["text"] not in footnotes:
-                missing_footnotes.append(ref["text"])
+            if ref.text not in footnotes and ref.text not in missing_footnotes:
+                missing_footnotes.append(ref.text)
 
-        if missing_footnotes:
-            self.logger.warning(f"Missing footnotes for references: {missing_footnotes}")
+        self.stats.add_time("reference_detection", time.perf_counter() - detect_start)
 
-            # Second attempt to find missing footnotes
-            for ref_num in missing_footnotes:
-                # Look for text pattern: number followed by text
-                pattern = f"{ref_num}\\s+([^0-9]+?)(?=\\d|$)"
-                page_text = page.get_text()
-                matches = re.finditer(pattern, page_text, re.DOTALL)
-
-                for match in matches:
-                    if match.group(1).strip():
-                        footnotes[ref_num] = match.group(1).strip()
-                        break
+        # Drawings are only extracted when the text pass could not place every footnote
+        boundary = "text"
+        if missing_footnotes:
+            with self.stats.timer("get_drawings"):
+                boundary = "none"
+                self.stats.incr("drawing_pages")
+                section = self.find_footnote_section(page)
+                if section is not None:
+                    boundary = "separator"
+                    below = self.footnotes_below(layout, section["section_start"])
+                    for ref_num in list(missing_footnotes):
+                        if below.get(ref_num):
+                            footnotes[ref_num] = below[ref_num]
+                            missing_footnotes.remove(ref_num)
+        self.stats.note("footnote_boundary", boundary)
+        self.last_boundary = boundary
 
-        self.logger.info(f"Found {len(main_footnote_refs)} references and {len(footnotes)} footnotes")
+        if missing_footnotes:
+            self.logger.debug("Missing footnotes for references: %s", missing_footnotes)
+
+            # Second attempt to find missing footnotes: one scan of the page text
+            # for numbered bodies, keeping the first non-empty body of each missing number
+            with self.stats.timer("regex_fallback"):
+                wanted = {ref_num.strip(): ref_num for ref_num in missing_footnotes}
+                for match in NUMBERED_TEXT.finditer(layout.text):
+                    number, body = match.group(1), match.group(2).strip()
+                    if body and number in wanted:
+                        footnotes[wanted.pop(number)] = body
+                        self.stats.incr("fallback_hits")
+                        if not wanted:
+                            break
+
+        self.stats.incr("spans", span_count)
+        self.stats.incr("references", len(main_footnote_refs))
+        self.stats.incr("footnotes", len(footnotes))
+        self.logger.debug("Found %d references and %d footnotes", len(main_footnote_refs), len(footnotes))
         return footnotes, main_footnote_refs, footnote_markers
 
-    def is_smaller_font(self, span, line_spans):
-        """Improved font size comparison"""
-        if not line_spans:
-            return False
-
-        # Get average size of normal text
-        sizes = [s["size"] for s in line_spans if not s["text"].strip().isdigit()]
-        if not sizes:
-            return False
-
-        avg_font_size = sum(sizes) / len(sizes)
-        return span["size"] < avg_font_size * 0.85  # Slightly more lenient threshold
+    @staticmethod
+    def span_key(span):
+        """Identity of a span that survives re-parsing the same page"""
+        return (span.text, span.bbox)
 
-    def organize_content(self, page, footnotes, main_footnote_refs):
+    def organize_content(self, page, footnotes, main_footnote_refs, layout=None):
         """Enhanced content organization"""
-        blocks = page.get_text("dict")["blocks"]
+        if layout is None:
+            with self.stats.timer("text_extraction"):
+                layout = PageLayout(page)
+        organize_start = time.perf_counter()
+        blocks = layout.blocks
+        ref_spans = {self.span_key(ref) for ref in main_footnote_refs}
         current_text = []
         current_paragraph = []
 
         for block in blocks:
-            for line in block.get("lines", []):
+            for line in block.lines:
                 line_text = []
                 ref_found = False
 
-                for span in line.get("spans", []):
+                for span in line:
                     # Check if this span is a footnote reference
-                    is_ref = any(ref["text"] == span["text"] for ref in main_footnote_refs)
+                    is_ref = self.span_key(span) in ref_spans
 
                     if is_ref:
                         # Add text before reference
@@ -234,7 +546,7 @@ class PDFProcessor:
                             line_text = []
 
                         # Get the actual footnote text
-                        footnote_num = span["text"]
+                        footnote_num = span.text
                         if footnote_num in footnotes:
                             # Add the complete paragraph with reference
                             if current_text:
@@ -247,16 +559,16 @@ class PDFProcessor:
                             ref_found = True
                         else:
                             # If footnote not found, still include the reference number
-                            line_text.append(span["text"])
-                            self.logger.warning(f"Missing footnote for reference {footnote_num}")
+                            line_text.append(span.text)
+                            self.logger.debug("Missing footnote for reference %s", footnote_num)
                     else:
-                        line_text.append(span["text"])
+                        line_text.append(span.text)
 
                 if line_text:
                     current_text.extend(line_text)
 
                 # Add line break between lines if needed
-                if len(line.get("spans", [])) > 0:  # If line had content
+                if len(line) > 0:  # If line had content
                     current_text.append(" ")
 
             # End of block - add accumulated text if no reference was found
@@ -266,23 +578,23 @@ class PDFProcessor:
                     self.excel_data.append([text, ""])
                 current_text = []
 
+        self.stats.add_time("organize", time.perf_counter() - organize_start)
+
 
     def process_page(self, page):
         """Process single page content with improved footnote handling"""
         # First extract footnotes and references
-        footnotes, main_footnote_refs, footnote_markers = self.extract_footnotes_and_refs(page)
+        layout = PageLayout(page)
+        footnotes, main_footnote_refs, footnote_markers = self.extract_footnotes_and_refs(page, layout)
 
-        # Debug print
-        print("\nExtracted Footnotes:")
+        # Debug output
         for num, text in footnotes.items():
-            print(f"Footnote {num}: {text}")
-
-        print("\nMain References:")
+            self.logger.debug("Footnote %s: %s", num, text)
         for ref in main_footnote_refs:
-            print(f"Reference: {ref['text']}")
+            self.logger.debug("Reference: %s", ref.text)
 
         # Process and organize content
-        self.organize_content(page, footnotes, main_footnote_refs)
+        self.organize_content(page, footnotes, main_footnote_refs, layout)
 
     # Add this helper method for debugging
     def print_text_block(self, text_block):
@@ -292,112 +604,376 @@ class PDFProcessor:
             print(f"{i}: {text} (Font size: {props.get('size', 'N/A')})")
 
 
-    def create_excel_file(self, input_pdf_path):
-            """Create formatted Excel file"""
-            output_path = input_pdf_path.replace('.pdf', '_Final.xlsx')
-
-            # Create DataFrame
-            df = pd.DataFrame(self.excel_data, columns=['Content', 'Footnotes'])
-
-            # Write to Excel with formatting
-            with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
-                df.to_excel(writer, index=False, sheet_name='Processed Content')
-
-                # Get worksheet
-                worksheet = writer.sheets['Processed Content']
-
-                # Format columns
-                worksheet.column_dimensions['A'].width = 60
-                worksheet.column_dimensions['B'].width = 40
-
-                # Format cells
-                for row in range(2, len(self.excel_data) + 2):
-                    cell_a = worksheet.cell(row=row, column=1)
-                    cell_b = worksheet.cell(row=row, column=2)
-
-                    # Basic formatting
-                    for cell in [cell_a, cell_b]:
-                        cell.alignment = Alignment(wrap_text=True,
-                                                vertical='top',
-                                                horizontal='left')
-
-                    # Special formatting for page markers
-                    if cell_a.value and isinstance(cell_a.value, str) and cell_a.value.startswith('****'):
-                        cell_a.font = Font(bold=True)
-                        cell_a.alignment = Alignment(horizontal='center')
-
-                    # Format footnotes
-                    if cell_b.value:
-                        cell_b.font = Font(italic=True)
-
-            print(f"\nExcel file created: {output_path}")
-            return output_path
-
+    def get_output_path(self, input_pdf_path, output_format="xlsx"):
+        """Output path derived from the input PDF path, e.g. report.pdf -> report_Final.xlsx"""
+        return os.path.splitext(input_pdf_path)[0] + '_Final' + get_writer(output_format).extension
+
+    @staticmethod
+    def check_output_path(input_pdf_path, output):
+        """Refuse to write the output over the input PDF, which writers truncate before it is read"""
+        if not isinstance(output, str):
+            return
+        if os.path.exists(output) and os.path.exists(input_pdf_path):
+            same = os.path.samefile(output, input_pdf_path)
+        else:
+            same = os.path.realpath(output) == os.path.realpath(input_pdf_path)
+        if same:
+            raise ValueError(f"Output path {output} is the input PDF")
+
+    def create_excel_file(self, input_pdf_path, output=None):
+        """Create formatted Excel file from the accumulated rows"""
+        return self.create_output_file(input_pdf_path, output, "xlsx")
+
+    def create_output_file(self, input_pdf_path, output=None, output_format="xlsx"):
+        """Write the accumulated rows in output_format ('xlsx', 'csv', 'jsonl' or 'parquet')
+
+        output may be a path or a binary file object such as io.BytesIO;
+        by default the file is written next to the input PDF.
+        """
+        if output is None:
+            output = self.get_output_path(input_pdf_path, output_format)
+        self.check_output_path(input_pdf_path, output)
+
+        with self.stats.timer("excel_write"):
+            with get_writer(output_format)(output) as writer:
+                writer.write_rows(self.excel_data)
+
+        if isinstance(output, str):
+            self.logger.info("Output file created: %s", output)
+        return output
 
     def validate_footnote_matching(self, footnotes, main_footnote_refs):
-        """Validate footnote matching and print diagnostic information"""
-        print("\nValidating Footnote Matching:")
+        """Validate footnote matching and return the diagnostic messages"""
+        diagnostics = []
 
         for ref in main_footnote_refs:
-            ref_num = ref["text"]
+            ref_num = ref.text
             if ref_num in footnotes:
-                print(f"\nReference {ref_num}:")
-                print(f"Position in text: {ref.get('bbox', 'Unknown position')}")
-                print(f"Matched footnote: {footnotes[ref_num]}")
+                diagnostics.append(f"Reference {ref_num} at {ref.bbox} "
+                                   f"matched footnote: {footnotes[ref_num]}")
             else:
-                print(f"\nWarning: No footnote found for reference {ref_num}")
+                diagnostics.append(f"Warning: No footnote found for reference {ref_num}")
 
         # Check for unmatched footnotes
-        ref_numbers = {ref["text"] for ref in main_footnote_refs}
+        ref_numbers = {ref.text for ref in main_footnote_refs}
         for footnote_num in footnotes:
             if footnote_num not in ref_numbers:
-                print(f"\nWarning: Footnote {footnote_num} has no matching reference")
-
-    def process_pdf(self, file_path):
-        """Main processing function"""
+                diagnostics.append(f"Warning: Footnote {footnote_num} has no matching reference")
+
+        for message in diagnostics:
+            self.logger.debug("%s", message)
+        return diagnostics
+
+    def format_debug_report(self):
+        """Render the per-page diagnostics collected with debug=True as text"""
+        lines = []
+        for entry in self.debug_report:
+            lines.append(f"**** Page {entry['page']} ****")
+            lines.append(f"Found {len(entry['footnotes'])} footnotes and "
+                         f"{len(entry['references'])} references")
+            lines.append(f"Footnote boundary: {entry['footnote_boundary']}")
+            for num, text in entry["footnotes"].items():
+                lines.append(f"Footnote {num}: {text}")
+            lines.extend(entry["diagnostics"])
+        return "\n".join(lines)
+
+    def print_debug_report(self):
+        """Print the collected diagnostics; the pipeline itself never writes to stdout"""
+        print(self.format_debug_report())
+
+    def process_single_page(self, doc, page_num):
+        """Process one page and return its [Content, Footnotes] rows, without the page marker"""
+        page = doc[page_num]
+        self.current_page = page_num + 1
+        self.logger.debug("Processing page %d", page_num + 1)
+
+        # Unchanged pages are stitched in from the page cache
+        fingerprint = None
+        if self.page_cache is not None:
+            fingerprint = self.page_cache.fingerprint(page)
+            cached = self.page_cache.get(fingerprint)
+            if cached is not None:
+                self.stats.incr("cached_pages")
+                return cached["rows"]
+
+        # organize_content appends to excel_data, so collect this page's rows apart
+        accumulated = self.excel_data
+        self.excel_data = []
         try:
-            print(f"Processing PDF: {file_path}")
-            doc = fitz.open(file_path)
-
-            for page_num in range(len(doc)):
-                page = doc[page_num]
-                print(f"\nProcessing page {page_num + 1}")
-
-                # Use your extraction method
-                footnotes, main_footnote_refs, footnote_markers = self.extract_footnotes_and_refs(page)
-                print(f"Found {len(footnotes)} footnotes and {len(main_footnote_refs)} references")
+            # Parse the page once and share the layout between stages
+            with self.stats.timer("text_extraction"):
+                layout = PageLayout(page)
+
+            # Use your extraction method
+            footnotes, main_footnote_refs, footnote_markers = self.extract_footnotes_and_refs(page, layout)
+
+            # Process and organize content for Excel
+            self.organize_content(page, footnotes, main_footnote_refs, layout)
+            rows = self.excel_data
+        finally:
+            self.excel_data = accumulated
+
+        if self.debug:
+            self.debug_report.append({
+                "page": page_num + 1,
+                "footnotes": footnotes,
+                "references": [ref.text for ref in main_footnote_refs],
+                "footnote_boundary": self.last_boundary,
+                "diagnostics": self.validate_footnote_matching(footnotes, main_footnote_refs),
+            })
+
+        if fingerprint is not None:
+            self.page_cache.put(fingerprint, rows, footnotes)
+        return rows
+
+    def iter_page_rows(self, doc, page_numbers):
+        """Yield (page_num, rows) for the given 0-based pages of an open document
+
+        In bounded-memory mode the document may be reopened along the way;
+        handles opened here are also closed here.
+        """
+        reopened = None
+        pages_since_relief = 0
+        try:
+            for page_num in page_numbers:
+                self.stats.begin_page(page_num + 1)
+                try:
+                    rows = self.process_single_page(doc, page_num)
+                finally:
+                    self.stats.end_page()
+                yield page_num, rows
+
+                pages_since_relief += 1
+                if self.memory_limit_mb and pages_since_relief >= MEMORY_RELIEF_INTERVAL:
+                    rss = current_rss()
+                    if rss is not None and rss > self.memory_limit_mb * 1024 * 1024:
+                        doc = reopened = self.relieve_memory(doc)
+                        pages_since_relief = 0
+        finally:
+            if reopened is not None and not reopened.is_closed:
+                reopened.close()
+
+    def relieve_memory(self, doc):
+        """Drop MuPDF's cached fonts, images and parsed objects, and return a fresh document handle
+
+        The document is closed first so the store entries it holds can be
+        freed. Documents opened from memory have no path to reopen from, so
+        only the store is emptied for them.
+        """
+        self.stats.incr("memory_reliefs")
+        path = doc.name
+        if path:
+            doc.close()
+        fitz.TOOLS.store_shrink(100)
+        gc.collect()
+        self.logger.debug("Page %d: RSS over %s MB, emptied the MuPDF store", self.current_page,
+                          self.memory_limit_mb)
+        return fitz.open(path) if path else doc
+
+    def worker_settings(self):
+        """Constructor arguments that parallel workers need to process pages like this processor"""
+        return {"page_cache": self.page_cache, "debug": self.debug, "memory_limit_mb": self.memory_limit_mb}
+
+    def iter_pages_parallel(self, file_path, page_numbers):
+        """Shard the selected pages into runs and process them in a process pool
+
+        Pages are yielded back in page order, so the result matches the serial path.
+        """
+        workers = min(self.workers, len(page_numbers))
+        # Several shards per worker keeps the pool busy when page costs vary
+        shard_size = max(1, -(-len(page_numbers) // (workers * 4)))
+        shards = [
+            (file_path, page_numbers[start:start + shard_size], self.worker_settings())
+            for start in range(0, len(page_numbers), shard_size)
+        ]
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for result in executor.map(_process_shard, shards):
+                self.stats.merge(result["stats"])
+                self.debug_report.extend(result["debug_report"])
+                if self.page_cache is not None:
+                    self.page_cache.hits += result["cache_hits"]
+                    self.page_cache.misses += result["cache_misses"]
+                yield from result["pages"]
+
+    def iter_pages(self, file_path, pages=None):
+        """Yield (page_num, rows) for the selected pages, serially or across the process pool
+
+        pages selects 1-based pages as accepted by select_pages; only those
+        pages are loaded and parsed.
+        """
+        # Every run starts with fresh instrumentation and diagnostics
+        self.stats = ProcessingStats()
+        self.debug_report = []
+        doc = fitz.open(file_path)
+        self.label_rules = doc.get_page_labels()
+        self.document_page_count = len(doc)
+        try:
+            page_numbers = self.page_numbers = select_pages(pages, len(doc))
+        except ValueError:
+            doc.close()
+            raise
+        page_count = len(page_numbers)
 
-                # Process and organize content for Excel
-                self.organize_content(page, footnotes, main_footnote_refs)
+        if self.workers > 1 and page_count > 1:
+            # Workers open their own document handles
+            doc.close()
+            results = self.iter_pages_parallel(file_path, page_numbers)
+        else:
+            results = self.iter_page_rows(doc, page_numbers)
 
-                # Add page marker
-                self.excel_data.append([f"**** Page {self.current_page} ****", ""])
-                self.current_page += 1
+        started = time.perf_counter()
+        try:
+            for pages_done, page in enumerate(results, 1):
+                if self.progress_callback is not None:
+                    self.progress_callback(self.progress_report(pages_done, page_count, started))
+                yield page
+        finally:
+            if not doc.is_closed:
+                doc.close()
+
+        if self.page_cache is not None:
+            self.page_cache.evict()
+            self.page_cache.log_stats()
+
+    def progress_report(self, pages_done, page_count, started):
+        """Throughput and ETA for a run that began at perf_counter() time started"""
+        elapsed = time.perf_counter() - started
+        pages_per_sec = pages_done / elapsed if elapsed > 0 else 0.0
+        eta = (page_count - pages_done) / pages_per_sec if pages_per_sec else None
+        return ProgressReport(pages_done, page_count, elapsed, pages_per_sec, eta)
+
+    def iter_rows(self, pdf_path, page_markers=False, pages=None):
+        """Lazily yield FootnoteRow records page by page, for every page or the selected pages
+
+        Nothing is accumulated on the processor and nothing is written to disk,
+        so callers can filter or stream the rows into any sink.
+        """
+        for position, (page_num, rows) in enumerate(self.iter_pages(pdf_path, pages), 1):
+            label = page_label(self.label_rules, page_num)
+            for content, footnote in rows:
+                yield FootnoteRow.from_excel_row(label, content, footnote)
+            if page_markers:
+                # The marker after a page announces the next page of the run; only the
+                # document's last page is followed by a closing marker
+                if position < len(self.page_numbers):
+                    next_page = self.page_numbers[position]
+                elif page_num == self.document_page_count - 1:
+                    next_page = page_num + 1
+                else:
+                    continue
+                yield FootnoteRow(label, f"**** Page {page_label(self.label_rules, next_page)} ****", "", "")
+
+    def process_pdf(self, file_path, output=None, output_format="xlsx", pages=None):
+        """Main processing function
+
+        Writes the rows to output (a path or binary file object, next to the
+        input PDF by default) in output_format and returns it: 'xlsx' for the
+        formatted workbook, or 'csv', 'jsonl' or 'parquet' for bulk exports
+        that skip the workbook cost. pages limits the run to a selection of
+        pages such as "1-5, 8, 10-" (see select_pages). The first
+        preview_size rows are kept in preview_rows.
+        """
+        try:
+            self.logger.info("Processing PDF: %s", file_path)
+            writer_class = get_writer(output_format)
+            if output is None:
+                output = self.get_output_path(file_path, output_format)
+            self.check_output_path(file_path, output)
+            self.preview_rows = []
+            self.excel_data = []
+
+            if self.stream_output:
+                self.writer = writer_class(output)
+
+            # The output file is one consumer of the row generator
+            write_seconds = 0.0
+            for row in self.iter_rows(file_path, page_markers=True, pages=pages):
+                excel_row = row.to_excel_row()
+                if len(self.preview_rows) < self.preview_size:
+                    self.preview_rows.append(excel_row)
+
+                if self.writer is not None:
+                    write_start = time.perf_counter()
+                    self.writer.write_row(*excel_row)
+                    write_seconds += time.perf_counter() - write_start
+                else:
+                    self.excel_data.append(excel_row)
+            self.stats.add_time("excel_write", write_seconds)
+
+            # Create output file
+            if self.writer is not None:
+                with self.stats.timer("excel_write"):
+                    self.writer.close()
+                if isinstance(output, str):
+                    self.logger.info("Output file created: %s", output)
+            else:
+                self.create_output_file(file_path, output, output_format)
 
-            # Create Excel file
-            self.create_excel_file(file_path)
-            doc.close()
+            self.stats.sample_rss()
+            self.logger.info("Processed %d pages, peak RSS %.1f MB", self.stats.counters["pages"],
+                             self.stats.peak_rss_mb)
+            if self.stats_path:
+                self.stats.dump(self.stats_path)
+            return output
 
         except Exception as e:
-            print(f"Error processing PDF: {str(e)}")
+            self.logger.error("Error processing PDF: %s", e)
+            if self.writer is not None:
+                self.writer.discard()
             raise
+        finally:
+            self.writer = None
 
     # Example usage:
     def process_page(self, page):
         """Enhanced page processing with validation"""
-        footnotes, main_footnote_refs, footnote_markers = self.extract_footnotes_and_refs(page)
+        layout = PageLayout(page)
+        footnotes, main_footnote_refs, footnote_markers = self.extract_footnotes_and_refs(page, layout)
 
         # Validate footnote matching
         self.validate_footnote_matching(footnotes, main_footnote_refs)
 
         # Process content with validated footnotes
-        self.organize_content(page, footnotes, main_footnote_refs)
+        self.organize_content(page, footnotes, main_footnote_refs, layout)
+
+def _process_shard(shard):
+    """Worker entry point: process a run of pages with its own fitz document handle"""
+    file_path, page_numbers, settings = shard
+    processor = PDFProcessor(**settings)
+    page_cache = processor.page_cache
+    # The cache arrives pickled with the parent's counters, so report deltas
+    cache_hits, cache_misses = (page_cache.hits, page_cache.misses) if page_cache else (0, 0)
+
+    doc = fitz.open(file_path)
+    try:
+        pages = list(processor.iter_page_rows(doc, page_numbers))
+    finally:
+        # Bounded-memory mode may already have closed it and continued on a fresh handle
+        if not doc.is_closed:
+            doc.close()
 
-def process_pdf_file(file_path):
-    """Process a PDF file and create Excel output"""
-    processor = PDFProcessor()
-    processor.process_pdf(file_path)
+    if page_cache is not None:
+        cache_hits = page_cache.hits - cache_hits
+        cache_misses = page_cache.misses - cache_misses
+    return {
+        "pages": pages,
+        "stats": processor.stats.to_dict(),
+        "debug_report": processor.debug_report,
+        "cache_hits": cache_hits,
+        "cache_misses": cache_misses,
+    }
+
+def iter_rows(pdf_path, workers=1, page_markers=False, pages=None):
+    """Lazily yield FootnoteRow records for a PDF without writing any output"""
+    return PDFProcessor(workers=workers).iter_rows(pdf_path, page_markers=page_markers, pages=pages)
+
+def process_pdf_file(file_path, workers=1, stream_output=False, output_format="xlsx", pages=None):
+    """Process a PDF file and create Excel (or CSV, JSONL, Parquet) output"""
+    processor = PDFProcessor(workers=workers, stream_output=stream_output)
+    return processor.process_pdf(file_path, output_format=output_format, pages=pages)
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     pdf_path = "/content/MC371.pdf"  # Replace with actual path
     process_pdf_file(pdf_path)
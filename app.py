@@ -7,7 +7,10 @@ import base64
 from pathlib import Path
 import pandas as pd
 import fitz  # PyMuPDF
-from PDFProcessor import PDFProcessor
+import shutil
+from result_cache import PageCache, ResultCache
+from jobs import JobManager, QUEUED, RUNNING, FAILED, process_upload, record_cache_counts
+from functools import partial
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -17,31 +20,54 @@ logger = logging.getLogger(__name__)
 if 'theme' not in st.session_state:
     st.session_state.theme = "light"
 
+# Uploads are copied to disk in chunks of this many bytes
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# At most MAX_JOBS uploads are processed at once, each with its pages sharded across
+# PAGE_WORKERS processes. The defaults split the CPU cores between the jobs; set the
+# PDF_MAX_JOBS=1 environment variable to give a single large upload every core.
+MAX_JOBS = int(os.environ.get("PDF_MAX_JOBS", min(4, os.cpu_count() or 1)))
+PAGE_WORKERS = int(os.environ.get("PDF_PAGE_WORKERS", max(1, (os.cpu_count() or 1) // MAX_JOBS)))
+
 def save_uploaded_file(uploaded_file):
-    """Save uploaded file to temporary directory and return the path"""
+    """Save uploaded file to a unique temporary path and return the path
+
+    Every upload gets its own file, so concurrent uploads with the same name
+    never overwrite each other. The PDF is later opened by path, which lets
+    MuPDF read pages from disk on demand instead of holding another copy.
+    """
     try:
-        temp_dir = Path("temp")
-        temp_dir.mkdir(exist_ok=True)
-        temp_path = temp_dir / uploaded_file.name
-        with open(temp_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
-        return str(temp_path)
+        upload_dir = Path("temp") / "uploads"
+        upload_dir.mkdir(parents=True, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(prefix=f"{Path(uploaded_file.name).stem}-", suffix=".pdf",
+                                         dir=upload_dir)
+        uploaded_file.seek(0)
+        with os.fdopen(fd, "wb") as f:
+            shutil.copyfileobj(uploaded_file, f, UPLOAD_CHUNK_SIZE)
+        return temp_path
     except Exception as e:
         st.error(f"Error saving uploaded file: {str(e)}")
         logger.error(f"File save error: {str(e)}")
         return None
 
-def process_pdf(file_path):
-    """Process the PDF file and return the path to the Excel output"""
-    try:
-        processor = PDFProcessor()
-        processor.process_pdf(file_path)
-        excel_path = file_path.replace('.pdf', '_Final.xlsx')
-        return excel_path
-    except Exception as e:
-        st.error(f"Error processing PDF: {str(e)}")
-        logger.error(f"Processing error: {str(e)}")
-        return None
+@st.cache_resource
+def get_result_cache():
+    """Result cache shared by every session of the app"""
+    return ResultCache()
+
+@st.cache_resource
+def get_page_cache():
+    """Per-page cache so amended documents only reprocess changed pages"""
+    return PageCache()
+
+@st.cache_resource
+def get_job_manager():
+    """Bounded pool of job worker processes shared by every session of the app"""
+    result_cache, page_cache = get_result_cache(), get_page_cache()
+    return JobManager(partial(process_upload, result_cache=result_cache, page_cache=page_cache,
+                              workers=PAGE_WORKERS),
+                      max_jobs=MAX_JOBS,
+                      on_finished=partial(record_cache_counts, result_cache, page_cache))
 
 def get_base64_of_file(file_path):
     """Get base64 encoded version of a local file"""
@@ -269,23 +295,39 @@ def create_file_details_card(uploaded_file):
         </div>
     """
 
-def create_auto_download_button(excel_data, filename):
-    """Create auto-download button with enhanced UI"""
-    b64 = base64.b64encode(excel_data).decode()
-    
+def create_auto_download_button(button_key):
+    """Create auto-download script that clicks the download button with enhanced UI
+
+    The workbook itself is only sent when the button is clicked, so nothing
+    is embedded in the page. Runs in st.iframe, which has same-origin access
+    to the app, as scripts in st.markdown are not executed.
+    """
     return f"""
         <script>
+            const doc = window.parent.document;
+            let manualDownload = false;
+
+            async function findButton() {{
+                for (let attempt = 0; attempt < 50; attempt++) {{
+                    const button = doc.querySelector('.st-key-{button_key} button');
+                    if (button) return button;
+                    await new Promise(resolve => setTimeout(resolve, 100));
+                }}
+                return null;
+            }}
+
             async function downloadFile() {{
+                const button = await findButton();
+                if (!button) return;
+                button.addEventListener('click', event => {{
+                    if (event.isTrusted) manualDownload = true;
+                }});
+
                 await new Promise(resolve => setTimeout(resolve, 3000));
-                if (!window.manualDownload) {{
-                    const link = document.createElement('a');
-                    link.href = "data:application/vnd.openxmlformats-officedocument.spreadsheetml.sheet;base64,{b64}";
-                    link.download = "{filename}";
-                    document.body.appendChild(link);
-                    link.click();
-                    document.body.removeChild(link);
-                    
-                    const notification = document.createElement('div');
+                if (!manualDownload) {{
+                    button.click();
+
+                    const notification = doc.createElement('div');
                     notification.innerHTML = `
                         <div style="
                             position: fixed;
@@ -302,7 +344,7 @@ def create_auto_download_button(excel_data, filename):
                             ✅ File downloaded successfully!
                         </div>
                     `;
-                    document.body.appendChild(notification);
+                    doc.body.appendChild(notification);
                     setTimeout(() => notification.remove(), 3000);
                 }}
             }}
@@ -310,6 +352,101 @@ def create_auto_download_button(excel_data, filename):
         </script>
     """
 
+def format_eta(seconds):
+    """Human readable remaining time for the progress display"""
+    if seconds is None:
+        return "—"
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}h {minutes:02d}m"
+    if minutes:
+        return f"{minutes}m {seconds:02d}s"
+    return f"{seconds}s"
+
+def show_job(job_id):
+    """Show the progress or results of a background job, polling until it finishes"""
+    job = get_job_manager().get(job_id)
+    if job is None:
+        del st.session_state['job_id']
+        return
+
+    if job["state"] in (QUEUED, RUNNING):
+        if job["state"] == QUEUED:
+            st.info("⏳ Waiting for a free worker...")
+        else:
+            pages_done, page_count = job["pages_done"], job["page_count"]
+            fraction = pages_done / page_count if page_count else 0.0
+            st.progress(fraction, text=f"Processing your PDF... page {pages_done} of {page_count}")
+
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Pages done", f"{pages_done} / {page_count}")
+            col2.metric("Pages/sec", f"{job.get('pages_per_sec', 0.0):.1f}")
+            col3.metric("ETA", format_eta(job.get("eta")))
+        time.sleep(1)
+        st.rerun()
+
+    elif job["state"] == FAILED:
+        st.error(f"❌ Error: {job['error']}")
+
+    else:
+        show_results(job)
+
+def show_results(job):
+    """Preview and download the Excel output of a finished job"""
+    try:
+        excel_path = job["output_path"]
+        if not (excel_path and os.path.exists(excel_path)):
+            st.error("❌ Error: processed file is no longer available, please process the PDF again")
+            return
+
+        # Preview rows come back with the job, so the workbook is never parsed here
+        df = pd.DataFrame(job.get("preview") or [], columns=['Content', 'Footnotes'])
+
+        st.success("✅ PDF processed successfully!")
+
+        st.markdown("""
+            <div class="feature-card">
+                <h3 style="font-size: 1.2rem; font-weight: 600; margin-bottom: 1rem;">
+                    📊 Preview of Processed Content
+                </h3>
+            </div>
+        """, unsafe_allow_html=True)
+
+        st.dataframe(
+            df.head(10),
+            use_container_width=True,
+            hide_index=True
+        )
+
+        output_filename = f"{job['filename'].replace('.pdf', '_processed.xlsx')}"
+
+        # Only auto-download once per job, not on every rerun
+        auto_download = st.session_state.get('auto_downloaded') != job["id"]
+
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            if auto_download:
+                st.info("💡 File will automatically download in 3 seconds...")
+        with col2:
+            # Deferred: the workbook is read and sent once, over HTTP, when the button is clicked
+            st.download_button(
+                label="📥 Download Excel",
+                data=partial(Path(excel_path).read_bytes),
+                file_name=output_filename,
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                key='manual_download',
+                # Downloading changes nothing on the page, so don't rerun the app
+                on_click="ignore"
+            )
+            if auto_download:
+                st.iframe(create_auto_download_button('manual_download'), height="content")
+                st.session_state.auto_downloaded = job["id"]
+
+    except Exception as e:
+        st.error(f"❌ Error: {str(e)}")
+        logger.error(f"Processing error: {str(e)}")
+
 def main():
     st.set_page_config(
         page_title="PDF Footnote Processor",
@@ -356,59 +493,21 @@ def main():
     if uploaded_file:
         st.markdown(create_file_details_card(uploaded_file), unsafe_allow_html=True)
 
+        page_selection = st.text_input(
+            "Pages to process",
+            placeholder="All pages, or e.g. 1-5, 8, 10-",
+            help="Comma separated pages and ranges; a range may be open-ended, like 10-"
+        ).strip()
+
         if st.button("🚀 Process PDF", type="primary"):
-            with st.spinner("Processing your PDF... Please wait"):
-                try:
-                    temp_path = save_uploaded_file(uploaded_file)
-                    if temp_path:
-                        excel_path = process_pdf(temp_path)
-                        
-                        if excel_path and os.path.exists(excel_path):
-                            df = pd.read_excel(excel_path)
-                            
-                            st.success("✅ PDF processed successfully!")
-                            
-                            st.markdown("""
-                                <div class="feature-card">
-                                    <h3 style="font-size: 1.2rem; font-weight: 600; margin-bottom: 1rem;">
-                                        📊 Preview of Processed Content
-                                    </h3>
-                                </div>
-                            """, unsafe_allow_html=True)
-                            
-                            st.dataframe(
-                                df.head(10),
-                                use_container_width=True,
-                                hide_index=True
-                            )
-                            
-                            with open(excel_path, "rb") as file:
-                                excel_data = file.read()
-                                output_filename = f"{uploaded_file.name.replace('.pdf', '_processed.xlsx')}"
-                                
-                                col1, col2 = st.columns([3, 1])
-                                with col1:
-                                    st.info("💡 File will automatically download in 3 seconds...")
-                                with col2:
-                                    st.download_button(
-                                        label="📥 Download Excel",
-                                        data=excel_data,
-                                        file_name=output_filename,
-                                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                                        key='manual_download',
-                                        on_click=lambda: st.session_state.update({'manual_download': True})
-                                    )
-                                    st.markdown(create_auto_download_button(excel_data, output_filename), unsafe_allow_html=True)
-                            
-                            try:
-                                os.remove(temp_path)
-                                os.remove(excel_path)
-                            except Exception as e:
-                                logger.error(f"Error cleaning up files: {str(e)}")
-                
-                except Exception as e:
-                    st.error(f"❌ Error: {str(e)}")
-                    logger.error(f"Processing error: {str(e)}")
+            temp_path = save_uploaded_file(uploaded_file)
+            if temp_path:
+                st.session_state.job_id = get_job_manager().submit(
+                    temp_path, uploaded_file.name, {"pages": page_selection or None})
+
+    # Results of the current job survive reruns until a new upload is processed
+    if st.session_state.get('job_id'):
+        show_job(st.session_state.job_id)
 
     st.markdown('</div>', unsafe_allow_html=True)
 
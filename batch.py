@@ -0,0 +1,222 @@
+"""Batch-convert directories of PDFs to footnote files with a process pool
+
+Inputs may be PDF files, directories (searched recursively) or glob
+patterns; --format picks the output format (xlsx by default). Files are
+processed concurrently, one per worker process, and --page-workers
+additionally shards each file's pages across that many processes, so up to
+--workers x --page-workers processes run at once. A file whose output is
+newer than the PDF and was made by this processor version, according to
+the previous manifest, is skipped unless --force is given. A failing file
+is recorded in the manifest without stopping the batch.
+
+Usage:
+    python batch.py circulars/ --output-dir converted/
+    python batch.py "archive/2024-*/*.pdf" --workers 8 --manifest nightly.json
+    python batch.py circulars/ --format parquet
+    python batch.py huge-master-circular.pdf --workers 1 --page-workers 16
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from PDFProcessor import PDFProcessor, PROCESSOR_VERSION
+from writers import WRITERS, get_writer
+
+logger = logging.getLogger(__name__)
+
+DONE, SKIPPED, FAILED = "done", "skipped", "failed"
+# Seconds between progress log lines for a file that is still converting
+PROGRESS_LOG_INTERVAL = 10.0
+
+
+def find_pdfs(inputs):
+    """Expand files, directories and glob patterns into a sorted list of unique PDF paths"""
+    found = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            paths = glob.glob(os.path.join(item, "**", "*"), recursive=True)
+        elif os.path.isfile(item):
+            paths = [item]
+        else:
+            paths = glob.glob(item, recursive=True)
+            if not paths:
+                logger.warning("No files match %s", item)
+        found.update(os.path.abspath(path) for path in paths
+                     if path.lower().endswith(".pdf") and os.path.isfile(path))
+    return sorted(found)
+
+
+def output_path_for(pdf_path, output_dir=None, output_format="xlsx"):
+    """Where the output file for a PDF goes: next to it, or flat in output_dir"""
+    suffix = "_Final" + get_writer(output_format).extension
+    if output_dir is None:
+        return os.path.splitext(pdf_path)[0] + suffix
+    name = os.path.splitext(os.path.basename(pdf_path))[0] + suffix
+    return os.path.join(output_dir, name)
+
+
+def load_versions(manifest_path):
+    """Processor version that made each output, as recorded in an earlier manifest"""
+    try:
+        with open(manifest_path, encoding="utf-8") as f:
+            entries = json.load(f)["files"]
+    except (OSError, ValueError, KeyError, TypeError):
+        return {}
+    return {entry["output"]: entry["processor_version"] for entry in entries
+            if entry.get("processor_version")}
+
+
+def is_up_to_date(pdf_path, output_path, version=None):
+    """Whether output_path is newer than the PDF and was made by this processor version"""
+    return (version == PROCESSOR_VERSION and os.path.exists(output_path)
+            and os.path.getmtime(output_path) >= os.path.getmtime(pdf_path))
+
+
+def convert_file(pdf_path, output_path, output_format="xlsx", pages=None, memory_limit_mb=None, workers=1):
+    """Worker entry point: convert one PDF (or its selected pages) and report the outcome instead of raising
+
+    workers is the number of processes the file's pages are sharded across.
+    Throughput is logged every PROGRESS_LOG_INTERVAL seconds while the file
+    converts, and the last progress report is kept in the entry, so a failed
+    file shows how far it got.
+    """
+    entry = {"input": pdf_path, "output": output_path}
+    start = time.perf_counter()
+    last_logged = start
+
+    def progress(report):
+        nonlocal last_logged
+        entry["progress"] = {name: round(value, 3) if isinstance(value, float) else value
+                             for name, value in report.to_dict().items()}
+        now = time.perf_counter()
+        if now - last_logged >= PROGRESS_LOG_INTERVAL and report.pages_done < report.page_count:
+            last_logged = now
+            logger.info("%s: %d/%d pages, %.1f pages/s, ETA %.0fs", pdf_path, report.pages_done,
+                        report.page_count, report.pages_per_sec, report.eta or 0)
+
+    try:
+        processor = PDFProcessor(workers=workers, stream_output=True, memory_limit_mb=memory_limit_mb,
+                                 progress_callback=progress)
+        processor.process_pdf(pdf_path, output_path, output_format, pages)
+        entry.update(status=DONE, processor_version=PROCESSOR_VERSION,
+                     pages=processor.stats.counters["pages"],
+                     footnotes=processor.stats.counters["footnotes"],
+                     peak_rss_mb=processor.stats.peak_rss_mb)
+    except Exception as e:
+        entry.update(status=FAILED, error=f"{type(e).__name__}: {e}")
+    entry["seconds"] = round(time.perf_counter() - start, 3)
+    return entry
+
+
+def run_batch(pdf_paths, output_dir=None, workers=None, force=False, output_format="xlsx",
+              memory_limit_mb=None, versions=None, page_workers=1):
+    """Convert pdf_paths in a process pool and return one manifest entry per file, in input order
+
+    versions maps output paths to the processor version that made them (see
+    load_versions); outputs without a matching version are reprocessed.
+    """
+    versions = versions or {}
+    entries = {}
+    pending = []
+    claimed = {}
+    for pdf_path in pdf_paths:
+        output_path = output_path_for(pdf_path, output_dir, output_format)
+        if output_path in claimed:
+            # Same file name in two input directories, flattened into one output_dir
+            entries[pdf_path] = {"input": pdf_path, "output": output_path, "status": FAILED,
+                                 "error": f"output path already used by {claimed[output_path]}"}
+            continue
+        claimed[output_path] = pdf_path
+        if not force and is_up_to_date(pdf_path, output_path, versions.get(output_path)):
+            entries[pdf_path] = {"input": pdf_path, "output": output_path, "status": SKIPPED,
+                                 "processor_version": PROCESSOR_VERSION}
+        else:
+            pending.append((pdf_path, output_path))
+
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(convert_file, pdf_path, output_path, output_format, None,
+                                       memory_limit_mb, page_workers)
+                       for pdf_path, output_path in pending]
+            for done_count, future in enumerate(as_completed(futures), 1):
+                entry = future.result()
+                entries[entry["input"]] = entry
+                if entry["status"] == FAILED:
+                    logger.error("[%d/%d] %s failed: %s", done_count, len(pending), entry["input"],
+                                 entry["error"])
+                else:
+                    logger.info("[%d/%d] %s: %d pages in %.1fs", done_count, len(pending),
+                                entry["input"], entry["pages"], entry["seconds"])
+
+    return [entries[pdf_path] for pdf_path in pdf_paths]
+
+
+def summarize(entries, seconds):
+    counts = {status: sum(entry["status"] == status for entry in entries)
+              for status in (DONE, SKIPPED, FAILED)}
+    pages = sum(entry.get("pages", 0) for entry in entries)
+    return {
+        "files": len(entries),
+        **counts,
+        "pages": pages,
+        "seconds": round(seconds, 3),
+        "pages_per_sec": round(pages / seconds, 1) if seconds > 0 else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="+", help="PDF files, directories or glob patterns")
+    parser.add_argument("--output-dir", help="write all output files here instead of next to each PDF")
+    parser.add_argument("--format", default="xlsx", choices=list(WRITERS), help="output format (default xlsx)")
+    parser.add_argument("--workers", type=int, help="files converted at once (default: one per CPU)")
+    parser.add_argument("--page-workers", type=int, default=1,
+                        help="processes each file's pages are sharded across (default 1)")
+    parser.add_argument("--force", action="store_true", help="reprocess files whose output is up to date")
+    parser.add_argument("--memory-limit-mb", type=int,
+                        help="soft RSS limit per worker; past it MuPDF caches are dropped and the PDF reopened")
+    parser.add_argument("--manifest", default="batch_manifest.json",
+                        help="summary manifest path, also read to find up-to-date outputs "
+                             "(default batch_manifest.json)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    # Per-page logging from the workers would drown out the per-file progress
+    logging.getLogger("PDFProcessor").setLevel(logging.WARNING)
+
+    pdf_paths = find_pdfs(args.inputs)
+    if not pdf_paths:
+        logger.error("No PDF files found")
+        return 2
+
+    start = time.perf_counter()
+    entries = run_batch(pdf_paths, args.output_dir, args.workers, args.force, args.format,
+                        args.memory_limit_mb, load_versions(args.manifest), args.page_workers)
+    summary = summarize(entries, time.perf_counter() - start)
+
+    manifest = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "processor_version": PROCESSOR_VERSION,
+        },
+        "summary": summary,
+        "files": entries,
+    }
+    with open(args.manifest, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    logger.info("%d converted, %d up to date, %d failed in %.1fs; manifest written to %s",
+                summary[DONE], summary[SKIPPED], summary[FAILED], summary["seconds"], args.manifest)
+    return 1 if summary[FAILED] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
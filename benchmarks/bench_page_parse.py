@@ -0,0 +1,55 @@
+"""Pages/sec benchmark: per-stage page parsing vs the shared single-pass PageLayout
+
+Usage: python benchmarks/bench_page_parse.py [pages]
+"""
+import os
+import sys
+import time
+import logging
+import tempfile
+
+import fitz
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from PDFProcessor import PDFProcessor, PageLayout
+from benchmarks.synthetic import make_footnoted_pdf
+
+
+def run(pdf_path, shared_layout):
+    processor = PDFProcessor()
+    doc = fitz.open(pdf_path)
+    start = time.perf_counter()
+    for page in doc:
+        if shared_layout:
+            layout = PageLayout(page)
+            footnotes, refs, _ = processor.extract_footnotes_and_refs(page, layout)
+            processor.organize_content(page, footnotes, refs, layout)
+        else:
+            # Every stage extracts the page text on its own
+            footnotes, refs, _ = processor.extract_footnotes_and_refs(page)
+            processor.organize_content(page, footnotes, refs)
+    elapsed = time.perf_counter() - start
+    pages = len(doc)
+    doc.close()
+    return pages / elapsed
+
+
+def main():
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    logging.disable(logging.CRITICAL)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = os.path.join(tmp, "bench.pdf")
+        make_footnoted_pdf(pdf_path, pages)
+
+        before = run(pdf_path, shared_layout=False)
+        after = run(pdf_path, shared_layout=True)
+
+    print(f"Pages: {pages}")
+    print(f"Per-stage parsing:   {before:8.1f} pages/sec")
+    print(f"Shared page layout:  {after:8.1f} pages/sec")
+    print(f"Speedup:             {after / before:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""Memory held by raw get_text("dict") blocks vs the compact Block/Span model
+
+Usage: python benchmarks/bench_span_memory.py [pages]
+"""
+import os
+import sys
+import tempfile
+import tracemalloc
+
+import fitz
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from PDFProcessor import Block
+from benchmarks.synthetic import make_footnoted_pdf
+
+
+def retained_bytes(doc, convert):
+    """Bytes still allocated after keeping every page's blocks alive"""
+    tracemalloc.start()
+    retained = [convert(page.get_text("dict")["blocks"]) for page in doc]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del retained
+    return current
+
+
+def main():
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = os.path.join(tmp, "bench.pdf")
+        make_footnoted_pdf(pdf_path, pages, footnotes_per_page=8)
+        doc = fitz.open(pdf_path)
+        spans = sum(len(line.get("spans", [])) for page in doc
+                    for block in page.get_text("dict")["blocks"] for line in block.get("lines", []))
+
+        raw = retained_bytes(doc, lambda blocks: blocks)
+        compact = retained_bytes(doc, lambda blocks: [Block.from_dict(block) for block in blocks])
+        doc.close()
+
+    print(f"Pages: {pages}, spans: {spans}")
+    print(f"Raw dict blocks:  {raw / 2**20:8.2f} MB ({raw / spans:6.0f} bytes/span)")
+    print(f"Compact blocks:   {compact / 2**20:8.2f} MB ({compact / spans:6.0f} bytes/span)")
+    print(f"Reduction:        {1 - compact / raw:8.1%}")
+
+
+if __name__ == "__main__":
+    main()
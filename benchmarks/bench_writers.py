@@ -0,0 +1,58 @@
+"""Rows/sec benchmark: write throughput and output size of every output backend
+
+The rows are extracted from a synthetic PDF once and replayed into each
+writer, so only serialization is measured.
+
+Usage: python benchmarks/bench_writers.py [pages] [repeat]
+"""
+import os
+import sys
+import time
+import logging
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from PDFProcessor import iter_rows
+from writers import WRITERS
+from benchmarks.synthetic import make_footnoted_pdf
+
+
+def run(writer_class, rows, output_path, repeat):
+    """Best-of-repeat rows/sec for writing rows with writer_class"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with writer_class(output_path) as writer:
+            writer.write_rows(rows)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(rows) / best
+
+
+def main():
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    logging.disable(logging.CRITICAL)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = os.path.join(tmp, "bench.pdf")
+        make_footnoted_pdf(pdf_path, pages)
+        rows = [row.to_excel_row() for row in iter_rows(pdf_path, page_markers=True)]
+
+        print(f"Rows: {len(rows)} from {pages} pages")
+        print(f"{'format':<10}{'rows/sec':>12}{'size KB':>10}{'vs xlsx':>10}")
+        baseline = None
+        for output_format, writer_class in WRITERS.items():
+            try:
+                output_path = os.path.join(tmp, "bench" + writer_class.extension)
+                rate = run(writer_class, rows, output_path, repeat)
+            except ImportError as e:
+                print(f"{output_format:<10}{'skipped':>12}  ({e})")
+                continue
+            baseline = baseline or rate
+            size = os.path.getsize(output_path) / 1024
+            print(f"{output_format:<10}{rate:>12.0f}{size:>10.0f}{rate / baseline:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""Throughput benchmark suite over synthetic footnoted PDFs
+
+Each scenario runs in its own subprocess so peak RSS is measured per
+scenario. Results are written as JSON; pass --baseline to compare against
+an earlier results file and exit non-zero when throughput regresses.
+
+Usage:
+    python benchmarks/run_benchmarks.py --output benchmarks/results/latest.json
+    python benchmarks/run_benchmarks.py --baseline benchmarks/results/main.json
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import fitz
+
+from PDFProcessor import PDFProcessor, PROCESSOR_VERSION
+from benchmarks.synthetic import SEPARATORS, make_footnoted_pdf
+
+STAGES = ("parse", "detect", "organize", "write")
+
+
+def scenario_name(scenario):
+    return f"p{scenario['pages']}-f{scenario['footnotes_per_page']}-{scenario['separator']}"
+
+
+def run_scenario(scenario, repeat):
+    """Run one scenario in this process and return its measurements"""
+    logging.disable(logging.CRITICAL)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = os.path.join(tmp, "bench.pdf")
+        make_footnoted_pdf(pdf_path, scenario["pages"], scenario["footnotes_per_page"],
+                           scenario["separator"])
+
+        best = None
+        for _ in range(repeat):
+            processor = PDFProcessor()
+
+            start = time.perf_counter()
+            processor.process_pdf(pdf_path, os.path.join(tmp, "bench.xlsx"))
+            total = time.perf_counter() - start
+
+            stage_seconds = processor.stats.stage_seconds
+            stages = {
+                "parse": stage_seconds["text_extraction"],
+                "detect": (stage_seconds["get_drawings"] + stage_seconds["reference_detection"]
+                           + stage_seconds["regex_fallback"]),
+                "organize": stage_seconds["organize"],
+                "write": stage_seconds["excel_write"],
+            }
+            if best is None or total < best["total"]:
+                best = {"total": total, "stages": stages, "rows": len(processor.excel_data),
+                        "counters": dict(processor.stats.counters)}
+
+    return {
+        "name": scenario_name(scenario),
+        **scenario,
+        "rows": best["rows"],
+        "counters": best["counters"],
+        "seconds": round(best["total"], 6),
+        "pages_per_sec": round(scenario["pages"] / best["total"], 2),
+        "stages": {stage: round(seconds, 6) for stage, seconds in best["stages"].items()},
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def run_isolated(scenario, repeat):
+    """Run a scenario in a fresh interpreter so its peak RSS is its own"""
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--worker", json.dumps(scenario),
+         "--repeat", str(repeat)],
+        check=True, capture_output=True, text=True,
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def compare(results, baseline, tolerance):
+    """Print throughput against a baseline and return the names of regressed scenarios"""
+    baseline_by_name = {result["name"]: result for result in baseline["results"]}
+    regressions = []
+
+    print(f"\n{'scenario':<22}{'baseline':>12}{'current':>12}{'change':>10}")
+    for result in results:
+        previous = baseline_by_name.get(result["name"])
+        if previous is None:
+            print(f"{result['name']:<22}{'-':>12}{result['pages_per_sec']:>12.1f}{'new':>10}")
+            continue
+
+        change = result["pages_per_sec"] / previous["pages_per_sec"] - 1
+        flag = ""
+        if change < -tolerance:
+            regressions.append(result["name"])
+            flag = "  REGRESSION"
+        print(f"{result['name']:<22}{previous['pages_per_sec']:>12.1f}"
+              f"{result['pages_per_sec']:>12.1f}{change:>+10.1%}{flag}")
+
+    return regressions
+
+
+def parse_list(value, cast=str):
+    return [cast(item) for item in value.split(",") if item]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", default="50,200", help="comma separated page counts")
+    parser.add_argument("--footnotes", default="0,4,12", help="comma separated footnotes per page")
+    parser.add_argument("--separators", default="short,none",
+                        help=f"comma separated separator styles from {','.join(SEPARATORS)}")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per scenario, the fastest is kept")
+    parser.add_argument("--output", default=os.path.join(ROOT, "benchmarks", "results", "latest.json"))
+    parser.add_argument("--baseline", help="results JSON to compare throughput against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed pages/sec drop vs the baseline before failing (default 0.2)")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_scenario(json.loads(args.worker), args.repeat)))
+        return 0
+
+    scenarios = [
+        {"pages": pages, "footnotes_per_page": footnotes, "separator": separator}
+        for pages, footnotes, separator in itertools.product(
+            parse_list(args.pages, int), parse_list(args.footnotes, int), parse_list(args.separators))
+    ]
+
+    results = []
+    print(f"{'scenario':<22}{'pages/s':>10}" + "".join(f"{stage:>10}" for stage in STAGES) + f"{'rss MB':>10}")
+    for scenario in scenarios:
+        result = run_isolated(scenario, args.repeat)
+        results.append(result)
+        print(f"{result['name']:<22}{result['pages_per_sec']:>10.1f}"
+              + "".join(f"{result['stages'][stage]:>10.3f}" for stage in STAGES)
+              + f"{result['peak_rss_mb']:>10.1f}")
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "processor_version": PROCESSOR_VERSION,
+            "pymupdf": fitz.VersionBind,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\nThroughput regressed by more than {args.tolerance:.0%}: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+"""Synthetic footnoted PDFs for benchmarks, generated locally with PyMuPDF"""
+
+import random
+
+import fitz
+
+SEPARATORS = ("short", "full", "rect", "none")
+
+WORDS = [
+    "circular", "regulated", "entity", "shall", "comply", "with", "the", "provisions",
+    "of", "section", "master", "direction", "bank", "mutual", "fund", "scheme",
+    "disclosure", "investor", "board", "trustee", "period", "applicable", "amendment",
+]
+
+
+def _sentence(rng, words=12, fontsize=11, width=420):
+    """Random words, trimmed to fit width points so nothing is drawn off the page"""
+    text = " ".join(rng.choice(WORDS) for _ in range(words))
+    while fitz.get_text_length(text, fontsize=fontsize) > width:
+        text = text.rsplit(" ", 1)[0]
+    return text
+
+
+def _draw_separator(page, style, y):
+    """Draw the footnote separator in one of the styles seen in real circulars"""
+    width = page.rect.width
+    if style == "short":
+        page.draw_line((72, y), (72 + width * 0.3, y))
+    elif style == "full":
+        page.draw_line((72, y), (width - 72, y))
+    elif style == "rect":
+        # Rules drawn as thin filled rectangles instead of stroked lines
+        page.draw_rect(fitz.Rect(72, y, 72 + width * 0.3, y + 0.5), color=None, fill=(0, 0, 0))
+
+
+def make_footnoted_pdf(path, pages, footnotes_per_page=4, separator="short", seed=0):
+    """Write a PDF with superscript references in the body and numbered footnotes below a separator
+
+    Returns the total number of footnotes in the document.
+    """
+    if separator not in SEPARATORS:
+        raise ValueError(f"Unknown separator style {separator!r}, expected one of {SEPARATORS}")
+
+    rng = random.Random(seed)
+    doc = fitz.open()
+    ref_num = 1
+
+    for _ in range(pages):
+        page = doc.new_page()
+        refs = []
+
+        # Body text with a superscript reference at the end of the first lines
+        y = 72
+        for line in range(max(8, footnotes_per_page)):
+            text = _sentence(rng)
+            page.insert_text((72, y), text, fontsize=11)
+            if line < footnotes_per_page:
+                x = 72 + fitz.get_text_length(text, fontsize=11) + 1
+                page.insert_text((x, y - 4), str(ref_num), fontsize=7)
+                refs.append(ref_num)
+                ref_num += 1
+            y += 40
+
+        # Footnote section at the bottom of the page
+        if refs:
+            _draw_separator(page, separator, 600)
+        y = 620
+        for ref in refs:
+            page.insert_text((72, y), str(ref), fontsize=8)
+            # Leave a gap after the number, however many digits it has, so it stays a span of its own
+            x = 72 + fitz.get_text_length(str(ref), fontsize=8) + 4
+            page.insert_text((x, y), _sentence(rng, 8, fontsize=8).capitalize(), fontsize=8)
+            y += 12
+
+    doc.save(path)
+    doc.close()
+    return ref_num - 1
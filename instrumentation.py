@@ -0,0 +1,119 @@
+"""Low-overhead timing and counters for PDFProcessor runs"""
+
+import json
+import os
+import time
+from contextlib import contextmanager
+
+STAGES = ("text_extraction", "get_drawings", "reference_detection", "regex_fallback", "organize",
+          "excel_write")
+COUNTERS = ("pages", "cached_pages", "spans", "references", "footnotes", "fallback_hits",
+            "drawing_pages", "memory_reliefs")
+
+
+def current_rss():
+    """Resident set size of this process in bytes, or None where /proc is not available"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class ProcessingStats:
+    """Wall time per stage and per page, plus pipeline counters, for a single run"""
+
+    def __init__(self):
+        self.stage_seconds = dict.fromkeys(STAGES, 0.0)
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.pages = []
+        # Largest RSS sampled during this run. Not ru_maxrss, which is the peak over the
+        # whole process lifetime and so may belong to an earlier job of a reused worker.
+        self.peak_rss_mb = 0.0
+        self._page = None
+
+    def begin_page(self, page_number):
+        """Start attributing stage times to a page (1-based page number in the PDF)"""
+        self._page = {"page": page_number, "stages": {}}
+        self.pages.append(self._page)
+        self.counters["pages"] += 1
+
+    def end_page(self):
+        self._page = None
+        self.sample_rss()
+
+    def note(self, key, value):
+        """Record a per-page decision, e.g. which tier found the footnote boundary"""
+        if self._page is not None:
+            self._page[key] = value
+
+    def add_time(self, stage, seconds):
+        self.stage_seconds[stage] += seconds
+        if self._page is not None:
+            stages = self._page["stages"]
+            stages[stage] = stages.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.perf_counter() - start)
+
+    def incr(self, counter, amount=1):
+        self.counters[counter] += amount
+
+    def sample_rss(self):
+        """Fold the current RSS of this process into peak_rss_mb"""
+        rss = current_rss()
+        if rss is not None:
+            self.peak_rss_mb = max(self.peak_rss_mb, round(rss / (1024 * 1024), 1))
+
+    def merge(self, other):
+        """Fold in the to_dict() output of another run, e.g. a parallel worker's shard"""
+        for stage, seconds in other["stage_seconds"].items():
+            self.stage_seconds[stage] += seconds
+        for counter, value in other["counters"].items():
+            self.counters[counter] += value
+        self.pages.extend(other["pages"])
+        # Each worker reports its own peak; the largest single process is what has to fit
+        self.peak_rss_mb = max(self.peak_rss_mb, other.get("peak_rss_mb", 0.0))
+
+    def slowest_pages(self, count=10):
+        """Pages with the highest total stage time, slowest first"""
+        return sorted(self.pages, key=lambda page: sum(page["stages"].values()), reverse=True)[:count]
+
+    def to_dict(self):
+        return {
+            "stage_seconds": dict(self.stage_seconds),
+            "counters": dict(self.counters),
+            "peak_rss_mb": self.peak_rss_mb,
+            "pages": self.pages,
+        }
+
+    def to_json(self, indent=None):
+        return json.dumps(self.to_dict(), indent=indent)
+
+    def to_prometheus(self, prefix="pdf_processor"):
+        """Totals in the Prometheus text exposition format (per-page detail is omitted)"""
+        lines = [
+            f"# HELP {prefix}_stage_seconds Wall time spent in each processing stage",
+            f"# TYPE {prefix}_stage_seconds gauge",
+        ]
+        for stage, seconds in self.stage_seconds.items():
+            lines.append(f'{prefix}_stage_seconds{{stage="{stage}"}} {seconds:.6f}')
+        for counter, value in self.counters.items():
+            lines.append(f"# TYPE {prefix}_{counter} gauge")
+            lines.append(f"{prefix}_{counter} {value}")
+        lines.append(f"# TYPE {prefix}_peak_rss_mb gauge")
+        lines.append(f"{prefix}_peak_rss_mb {self.peak_rss_mb}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path):
+        """Write the stats to path, as Prometheus text for .prom files and JSON otherwise"""
+        with open(path, "w", encoding="utf-8") as f:
+            if path.endswith(".prom"):
+                f.write(self.to_prometheus())
+            else:
+                f.write(self.to_json(indent=2))
@@ -0,0 +1,251 @@
+"""Background processing jobs for the Streamlit app, backed by an on-disk job store"""
+
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from PDFProcessor import PDFProcessor
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class JobStore:
+    """One JSON file per job, so job state survives Streamlit reruns and restarts"""
+
+    def __init__(self, jobs_dir="temp/jobs"):
+        self.jobs_dir = jobs_dir
+        os.makedirs(self.jobs_dir, exist_ok=True)
+
+    def _path(self, job_id):
+        return os.path.join(self.jobs_dir, f"{job_id}.json")
+
+    def save(self, job):
+        job["updated"] = time.time()
+        tmp_path = self._path(job["id"]) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(job, f)
+        os.replace(tmp_path, self._path(job["id"]))
+
+    def load(self, job_id):
+        try:
+            with open(self._path(job_id), encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def all(self):
+        jobs = []
+        for name in os.listdir(self.jobs_dir):
+            if name.endswith(".json"):
+                job = self.load(name[:-len(".json")])
+                if job:
+                    jobs.append(job)
+        return jobs
+
+    def delete(self, job_id):
+        try:
+            os.remove(self._path(job_id))
+        except FileNotFoundError:
+            pass
+
+
+class JobManager:
+    """Runs processing jobs in a bounded pool of worker processes and records their progress
+
+    process_fn(pdf_path, progress, **options) must be picklable and return a dict
+    of JSON-serializable result fields, including output_path; progress(report)
+    may be called with a PDFProcessor.ProgressReport as pages complete. Each job
+    runs in one worker process, which writes its progress to the job store, so
+    PyMuPDF is never used from the app's threads and at most max_jobs processes
+    run at a time. on_finished(job), if given, is called in this process with
+    the record of every job its worker finished.
+    """
+
+    def __init__(self, process_fn, max_jobs=None, jobs_dir="temp/jobs", max_age=24 * 3600,
+                 on_finished=None):
+        self.process_fn = process_fn
+        self.on_finished = on_finished
+        self.store = JobStore(jobs_dir)
+        self.max_age = max_age
+        self.max_jobs = max_jobs or min(4, os.cpu_count() or 1)
+        self.executor = self._new_executor()
+        self._recover()
+
+    def _new_executor(self):
+        # Spawned, not forked: the Streamlit server that owns the pool is multi-threaded.
+        # Spawned workers start without logging configured, so they copy this process's level.
+        return ProcessPoolExecutor(max_workers=self.max_jobs, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=init_worker, initargs=(logging.getLogger().level,))
+
+    def _recover(self):
+        """Jobs left queued or running by a previous process can never finish"""
+        for job in self.store.all():
+            if job["state"] in (QUEUED, RUNNING):
+                job["state"] = FAILED
+                job["error"] = "Interrupted by a server restart"
+                self.store.save(job)
+
+    def submit(self, pdf_path, filename, options=None):
+        """Queue a PDF for processing and return its job ID
+
+        options are JSON-serializable keyword arguments passed on to process_fn.
+        """
+        self.cleanup()
+        job = {
+            "id": uuid.uuid4().hex,
+            "filename": filename,
+            "pdf_path": pdf_path,
+            "options": options or {},
+            "state": QUEUED,
+            "pages_done": 0,
+            "page_count": 0,
+            "pages_per_sec": 0.0,
+            "eta": None,
+            "output_path": None,
+            "preview": None,
+            "error": None,
+            "created": time.time(),
+        }
+        self.store.save(job)
+        try:
+            future = self.executor.submit(run_job, self.process_fn, job, self.store.jobs_dir)
+        except BrokenProcessPool:
+            # A worker that died takes the whole pool with it; start a fresh one
+            self.executor = self._new_executor()
+            future = self.executor.submit(run_job, self.process_fn, job, self.store.jobs_dir)
+        future.add_done_callback(lambda future: self._finished(job["id"], future))
+        logger.info("Queued job %s for %s", job["id"], filename)
+        return job["id"]
+
+    def _finished(self, job_id, future):
+        """Hand a finished job to on_finished, or record it as failed if its worker died"""
+        error = None if future.cancelled() else future.exception()
+        if error is None:
+            if self.on_finished is not None and not future.cancelled():
+                self.on_finished(future.result())
+            return
+        job = self.store.load(job_id)
+        if job is not None and job["state"] in (QUEUED, RUNNING):
+            job["state"] = FAILED
+            job["error"] = str(error) or type(error).__name__
+            self.store.save(job)
+            logger.error("Job %s failed: %s", job_id, job["error"])
+
+    def get(self, job_id):
+        return self.store.load(job_id)
+
+    def cleanup(self):
+        """Remove finished jobs and their files once they are older than max_age"""
+        cutoff = time.time() - self.max_age
+        for job in self.store.all():
+            if job["state"] in (DONE, FAILED) and job["updated"] < cutoff:
+                for path in (job.get("pdf_path"), job.get("output_path")):
+                    if path and os.path.exists(path):
+                        try:
+                            os.remove(path)
+                        except OSError as e:
+                            logger.error("Error cleaning up %s: %s", path, e)
+                self.store.delete(job["id"])
+
+
+def init_worker(level):
+    """Job worker initializer: log like the app, which configures logging only in its own process"""
+    logging.basicConfig(level=level)
+
+
+def run_job(process_fn, job, jobs_dir):
+    """Worker process entry point: run one job, saving its progress to the job store
+
+    Returns the final job record.
+    """
+    store = JobStore(jobs_dir)
+    job["state"] = RUNNING
+    store.save(job)
+    last_saved = 0.0
+
+    def progress(report):
+        nonlocal last_saved
+        job.update(report.to_dict())
+        # Throttle job store writes on fast documents
+        now = time.monotonic()
+        if now - last_saved >= 0.5 or report.pages_done == report.page_count:
+            last_saved = now
+            store.save(job)
+
+    try:
+        job.update(process_fn(job["pdf_path"], progress, **job.get("options", {})))
+        job["state"] = DONE
+        logger.info("Job %s finished", job["id"])
+    except Exception as e:
+        job["state"] = FAILED
+        job["error"] = str(e)
+        logger.error("Job %s failed: %s", job["id"], e)
+    store.save(job)
+    return job
+
+
+def process_upload(file_path, progress=None, result_cache=None, page_cache=None, pages=None, workers=1):
+    """Process an uploaded PDF and return the Excel output path with the preview rows
+
+    pages optionally selects pages such as "1-5, 8, 10-"; workers is the number
+    of processes the job's pages are sharded across. Runs in a job worker
+    process, so errors are raised for the job to record. The worker has its
+    own copies of the caches, so the hits and misses of this job are returned
+    in cache_counts for record_cache_counts to fold into the app's totals.
+    """
+    excel_path = os.path.splitext(file_path)[0] + '_Final.xlsx'
+    counts_before = cache_counts(result_cache, page_cache)
+    result = None
+
+    # Repeat uploads of the same document and page selection are served from the cache
+    if result_cache is not None:
+        cache_key = result_cache.key_for_file(file_path, {"pages": pages})
+        cached_path = result_cache.get(cache_key)
+        if cached_path:
+            shutil.copyfile(cached_path, excel_path)
+            result = {"output_path": excel_path, "preview": result_cache.get_preview(cache_key)}
+
+    if result is None:
+        processor = PDFProcessor(workers=workers, stream_output=True, page_cache=page_cache,
+                                 progress_callback=progress)
+        processor.process_pdf(file_path, excel_path, pages=pages)
+
+        if result_cache is not None:
+            result_cache.put(cache_key, excel_path, processor.preview_rows)
+        result = {"output_path": excel_path, "preview": processor.preview_rows}
+
+    counts = cache_counts(result_cache, page_cache)
+    result["cache_counts"] = {name: counts[name] - counts_before[name] for name in counts}
+    return result
+
+
+def cache_counts(result_cache, page_cache):
+    """Hits and misses counted so far by a result cache and a page cache, either may be None"""
+    return {
+        "result_hits": result_cache.hits if result_cache is not None else 0,
+        "result_misses": result_cache.misses if result_cache is not None else 0,
+        "page_hits": page_cache.hits if page_cache is not None else 0,
+        "page_misses": page_cache.misses if page_cache is not None else 0,
+    }
+
+
+def record_cache_counts(result_cache, page_cache, job):
+    """JobManager on_finished hook: add a job's cache hits and misses to the app-wide totals"""
+    counts = job.get("cache_counts")
+    if not counts:
+        return
+    if result_cache is not None:
+        result_cache.add_counts(counts["result_hits"], counts["result_misses"])
+    if page_cache is not None:
+        page_cache.add_counts(counts["page_hits"], counts["page_misses"])
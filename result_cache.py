@@ -0,0 +1,218 @@
+"""Persistent on-disk cache of finished Excel outputs, keyed by PDF content"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+from PDFProcessor import PROCESSOR_VERSION
+
+logger = logging.getLogger(__name__)
+
+
+class ResultCache:
+    """Content-addressed cache of processed workbooks with size-bounded LRU eviction
+
+    Keys combine the SHA-256 of the PDF bytes with the processor version and
+    processing settings, so a changed document, a new release or different
+    options never reuse a stale result.
+    """
+
+    def __init__(self, cache_dir="cache/results", max_bytes=500 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def key_for_file(self, pdf_path, settings=None):
+        """Cache key for a PDF on disk and the settings it is processed with"""
+        digest = hashlib.sha256()
+        with open(pdf_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return self.key_for_digest(digest.hexdigest(), settings)
+
+    def key_for_digest(self, pdf_sha256, settings=None):
+        """Cache key for an already computed SHA-256 of the PDF bytes"""
+        payload = json.dumps({
+            "pdf": pdf_sha256,
+            "version": PROCESSOR_VERSION,
+            "settings": settings or {},
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.xlsx")
+
+    def _preview_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.preview.json")
+
+    def get(self, key):
+        """Return the cached workbook path for key, or None on a miss"""
+        path = self._entry_path(key)
+        if os.path.exists(path):
+            # Refresh the entry's position in the LRU order
+            os.utime(path)
+            self.hits += 1
+            logger.info("Result cache hit %s (hits=%d, misses=%d)", key[:12], self.hits, self.misses)
+            return path
+
+        self.misses += 1
+        logger.info("Result cache miss %s (hits=%d, misses=%d)", key[:12], self.hits, self.misses)
+        return None
+
+    def add_counts(self, hits, misses):
+        """Add hits and misses counted by a copy of this cache in a worker process"""
+        self.hits += hits
+        self.misses += misses
+        logger.info("Result cache totals: hits=%d, misses=%d", self.hits, self.misses)
+
+    def get_preview(self, key):
+        """Preview rows stored with a cached workbook, or None"""
+        try:
+            with open(self._preview_path(key), encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def put(self, key, xlsx_path, preview=None):
+        """Store a finished workbook under key and evict old entries if over budget"""
+        if preview is not None:
+            with open(self._preview_path(key), "w", encoding="utf-8") as f:
+                json.dump(preview, f)
+
+        # Copy to a temp file first so readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        os.close(fd)
+        try:
+            shutil.copyfile(xlsx_path, tmp_path)
+            os.replace(tmp_path, self._entry_path(key))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.evict()
+        return self._entry_path(key)
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes"""
+        for path in evict_lru(self.cache_dir, ".xlsx", self.max_bytes):
+            key = os.path.basename(path)[:-len(".xlsx")]
+            if os.path.exists(self._preview_path(key)):
+                os.remove(self._preview_path(key))
+
+
+class PageCache:
+    """Per-page cache of processed rows, keyed by a fingerprint of the page content
+
+    An amended document shares most page fingerprints with its previous
+    version, so only the pages that actually changed are reprocessed.
+    """
+
+    def __init__(self, cache_dir="cache/pages", max_bytes=200 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def fingerprint(self, page):
+        """Hash of the page's content stream, form XObjects, fonts and geometry"""
+        doc = page.parent
+        digest = hashlib.sha256(PROCESSOR_VERSION.encode())
+        digest.update(repr((tuple(page.rect), page.rotation)).encode())
+        digest.update(page.read_contents())
+
+        # Text can also live in form XObjects referenced by the content stream
+        for xref, name, _, _ in page.get_xobjects():
+            digest.update(name.encode())
+            digest.update(doc.xref_stream(xref) or b"")
+
+        # Font identity without xrefs, which change between document versions
+        for font in page.get_fonts():
+            digest.update(repr(font[1:]).encode())
+        return digest.hexdigest()
+
+    def _entry_path(self, fingerprint):
+        return os.path.join(self.cache_dir, f"{fingerprint}.json")
+
+    def get(self, fingerprint):
+        """Return the cached page result, or None if the page must be processed"""
+        path = self._entry_path(fingerprint)
+        try:
+            with open(path, encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.misses += 1
+            return None
+
+        os.utime(path)
+        self.hits += 1
+        return entry
+
+    def put(self, fingerprint, rows, footnotes):
+        """Store the rows and footnotes produced for a page"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"rows": rows, "footnotes": footnotes}, f)
+            os.replace(tmp_path, self._entry_path(fingerprint))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        # Eviction scans the directory, so only run it periodically
+        self.writes += 1
+        if self.writes % 100 == 0:
+            self.evict()
+
+    def evict(self):
+        """Remove least recently used pages until the cache fits in max_bytes"""
+        evict_lru(self.cache_dir, ".json", self.max_bytes)
+
+    def add_counts(self, hits, misses):
+        """Add hits and misses counted by a copy of this cache in a worker process"""
+        self.hits += hits
+        self.misses += misses
+        self.log_stats()
+
+    def log_stats(self):
+        logger.info("Page cache: %d pages reused, %d processed", self.hits, self.misses)
+
+
+def evict_lru(cache_dir, suffix, max_bytes):
+    """Delete the least recently used files with suffix until cache_dir fits in max_bytes
+
+    Returns the paths that were removed.
+    """
+    removed = []
+    entries = []
+    total = 0
+    for name in os.listdir(cache_dir):
+        if not name.endswith(suffix):
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+        total += stat.st_size
+
+    entries.sort()
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+            removed.append(path)
+            logger.info("Cache evicted %s", os.path.basename(path))
+        except FileNotFoundError:
+            pass
+    return removed
@@ -0,0 +1,343 @@
+"""Headless HTTP service for footnote extraction, as a plain ASGI application
+
+Endpoints:
+    POST /jobs               submit a PDF as the raw request body; optional query
+                             parameters format (jsonl, csv, xlsx or parquet) and
+                             pages (e.g. 1-5,8,10-). Returns 202 with the job ID,
+                             or 429 when the service is at capacity.
+    GET  /jobs/{id}          job status
+    GET  /jobs/{id}/result   the output file, streamed; 409 until the job is done
+
+PDFs are processed in a process pool, one job per worker, with each job's
+pages sharded across page_workers more processes. At most workers +
+max_queue jobs are accepted at a time, the rest are turned away with 429
+and Retry-After.
+
+Usage:
+    python service.py --port 8000 --workers 4 --page-workers 4      (needs uvicorn)
+    curl --data-binary @circular.pdf "localhost:8000/jobs?pages=1-10"
+
+asgi_request() calls the app in-process without a server, for local testing.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import parse_qs
+
+from batch import FAILED as CONVERT_FAILED, convert_file
+from jobs import DONE, FAILED, QUEUED, RUNNING, init_worker
+from writers import WRITERS
+
+logger = logging.getLogger(__name__)
+
+MEDIA_TYPES = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv; charset=utf-8",
+    "jsonl": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+CHUNK_SIZE = 64 * 1024
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message, headers=()):
+        super().__init__(message)
+        self.status = status
+        self.headers = list(headers)
+
+
+class PDFService:
+    """ASGI app that queues PDFs for a process pool and serves the results"""
+
+    def __init__(self, workers=None, max_queue=16, work_dir="temp/service",
+                 max_upload_bytes=512 * 1024 * 1024, max_age=3600, page_workers=1):
+        self.workers = workers or os.cpu_count() or 1
+        # Processes each job's pages are sharded across, on top of its pool worker
+        self.page_workers = page_workers
+        # Jobs accepted at once (running plus waiting); beyond this submissions get 429
+        self.max_in_flight = self.workers + max_queue
+        self.work_dir = work_dir
+        self.max_upload_bytes = max_upload_bytes
+        self.max_age = max_age
+        self.jobs = {}
+        self.in_flight = 0
+        self.executor = None
+        self._slots = None
+        self._tasks = set()
+        os.makedirs(self.work_dir, exist_ok=True)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        parts = [part for part in scope["path"].split("/") if part]
+        method = scope["method"]
+        try:
+            if parts == ["jobs"]:
+                self._allow(method, "POST")
+                await self.submit(scope, receive, send)
+            elif len(parts) == 2 and parts[0] == "jobs":
+                self._allow(method, "GET")
+                await send_json(send, 200, self._public(self._job(parts[1])))
+            elif len(parts) == 3 and parts[0] == "jobs" and parts[2] == "result":
+                self._allow(method, "GET")
+                await self.result(self._job(parts[1]), send)
+            else:
+                raise HTTPError(404, "Not found")
+        except HTTPError as e:
+            await send_json(send, e.status, {"error": str(e)}, e.headers)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self._start()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def _start(self):
+        if self.executor is None:
+            self.executor = self._new_executor()
+            self._slots = asyncio.Semaphore(self.workers)
+
+    def _new_executor(self):
+        # Spawned, not forked: results are streamed from threads, and forking a threaded process
+        # can deadlock. Spawned workers start without logging configured, so they copy this level.
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=init_worker, initargs=(logging.getLogger().level,))
+
+    def _submit(self, fn, *args):
+        try:
+            return self.executor.submit(fn, *args)
+        except BrokenProcessPool:
+            # A worker that died takes the whole pool with it; start a fresh one
+            self.executor = self._new_executor()
+            return self.executor.submit(fn, *args)
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    @staticmethod
+    def _allow(method, allowed):
+        if method != allowed:
+            raise HTTPError(405, f"Method {method} not allowed", [("allow", allowed)])
+
+    def _job(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None:
+            raise HTTPError(404, f"Unknown job {job_id}")
+        return job
+
+    @staticmethod
+    def _public(job):
+        """Job fields reported to clients, without server-side paths"""
+        return {key: value for key, value in job.items() if not key.endswith("_path")}
+
+    async def submit(self, scope, receive, send):
+        """Admit a job if there is capacity, spool the upload to disk and queue it"""
+        params = parse_qs(scope["query_string"].decode())
+        output_format = params.get("format", ["jsonl"])[-1]
+        if output_format not in WRITERS:
+            raise HTTPError(400, f"Unknown format {output_format!r}, expected one of {', '.join(WRITERS)}")
+        pages = params.get("pages", [None])[-1]
+
+        self._start()
+        self.cleanup()
+        if self.in_flight >= self.max_in_flight:
+            raise HTTPError(429, "Too many jobs in progress, retry later", [("retry-after", "5")])
+
+        job_id = uuid.uuid4().hex
+        pdf_path = os.path.join(self.work_dir, f"{job_id}.pdf")
+        # Count the job before the upload finishes, so concurrent uploads can't overshoot the limit
+        self.in_flight += 1
+        try:
+            size = await self._receive_body(receive, pdf_path)
+            if not size:
+                raise HTTPError(400, "Request body must be a PDF")
+        except BaseException:
+            self.in_flight -= 1
+            if os.path.exists(pdf_path):
+                os.remove(pdf_path)
+            raise
+
+        job = {
+            "id": job_id,
+            "state": QUEUED,
+            "format": output_format,
+            "pages": pages,
+            "error": None,
+            "created": time.time(),
+            "pdf_path": pdf_path,
+            "output_path": os.path.join(self.work_dir, f"{job_id}{WRITERS[output_format].extension}"),
+        }
+        self.jobs[job_id] = job
+        task = asyncio.ensure_future(self._run(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        logger.info("Queued job %s (%d bytes, pages=%s)", job_id, size, pages)
+
+        await send_json(send, 202, {
+            "id": job_id,
+            "status_url": f"/jobs/{job_id}",
+            "result_url": f"/jobs/{job_id}/result",
+        })
+
+    async def _receive_body(self, receive, path):
+        """Write the request body to path chunk by chunk and return its size"""
+        size = 0
+        with open(path, "wb") as f:
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    raise HTTPError(400, "Client disconnected during upload")
+                chunk = message.get("body", b"")
+                size += len(chunk)
+                if size > self.max_upload_bytes:
+                    raise HTTPError(413, f"Upload exceeds {self.max_upload_bytes} bytes")
+                f.write(chunk)
+                if not message.get("more_body", False):
+                    return size
+
+    async def _run(self, job):
+        try:
+            # Wait for a free worker, so queued and running jobs can be told apart
+            async with self._slots:
+                job["state"] = RUNNING
+                entry = await asyncio.wrap_future(self._submit(convert_file, job["pdf_path"], job["output_path"],
+                                                               job["format"], job["pages"], None,
+                                                               self.page_workers))
+            if entry["status"] == CONVERT_FAILED:
+                job.update(state=FAILED, error=entry["error"])
+            else:
+                job.update(state=DONE, pages_done=entry["pages"], footnotes=entry["footnotes"],
+                           seconds=entry["seconds"])
+        except Exception as e:
+            job.update(state=FAILED, error=f"{type(e).__name__}: {e}")
+        finally:
+            self.in_flight -= 1
+            job["finished"] = time.time()
+            if os.path.exists(job["pdf_path"]):
+                os.remove(job["pdf_path"])
+        logger.info("Job %s %s", job["id"], job["state"])
+
+    async def result(self, job, send):
+        """Stream the output file of a finished job"""
+        if job["state"] != DONE:
+            raise HTTPError(409, f"Job is {job['state']}" + (f": {job['error']}" if job["error"] else ""))
+
+        path = job["output_path"]
+        loop = asyncio.get_running_loop()
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", MEDIA_TYPES[job["format"]].encode()),
+                (b"content-length", str(os.path.getsize(path)).encode()),
+                (b"content-disposition", f'attachment; filename="{os.path.basename(path)}"'.encode()),
+            ],
+        })
+        with open(path, "rb") as f:
+            while True:
+                chunk = await loop.run_in_executor(None, f.read, CHUNK_SIZE)
+                more = len(chunk) == CHUNK_SIZE
+                await send({"type": "http.response.body", "body": chunk, "more_body": more})
+                if not more:
+                    break
+
+    def cleanup(self):
+        """Forget finished jobs older than max_age and remove their output files"""
+        cutoff = time.time() - self.max_age
+        for job_id, job in list(self.jobs.items()):
+            if job.get("finished", cutoff) < cutoff:
+                if os.path.exists(job["output_path"]):
+                    os.remove(job["output_path"])
+                del self.jobs[job_id]
+
+
+async def send_json(send, status, payload, headers=()):
+    body = json.dumps(payload).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+                   + [(name.encode(), value.encode()) for name, value in headers],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def asgi_request(app, method, path, body=b"", headers=None):
+    """Call an ASGI app in-process and return (status, headers, body), for local testing
+
+    The body is delivered in CHUNK_SIZE pieces, like a streamed upload.
+    """
+    path, _, query = path.partition("?")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()],
+        "client": ("127.0.0.1", 0),
+        "server": ("testserver", 80),
+    }
+    chunks = [body[start:start + CHUNK_SIZE] for start in range(0, len(body), CHUNK_SIZE)] or [b""]
+    messages = [{"type": "http.request", "body": chunk, "more_body": index < len(chunks) - 1}
+                for index, chunk in enumerate(chunks)]
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    response = {"status": None, "headers": {}, "body": bytearray()}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = {name.decode(): value.decode() for name, value in message["headers"]}
+        elif message["type"] == "http.response.body":
+            response["body"] += message.get("body", b"")
+
+    await app(scope, receive, send)
+    return response["status"], response["headers"], bytes(response["body"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, help="jobs processed at once (default: one per CPU)")
+    parser.add_argument("--page-workers", type=int, default=1,
+                        help="processes each job's pages are sharded across (default 1)")
+    parser.add_argument("--max-queue", type=int, default=16,
+                        help="jobs allowed to wait for a worker before submissions get 429 (default 16)")
+    args = parser.parse_args()
+
+    import uvicorn
+
+    logging.basicConfig(level=logging.INFO)
+    logging.getLogger("PDFProcessor").setLevel(logging.WARNING)
+    service = PDFService(workers=args.workers, max_queue=args.max_queue, page_workers=args.page_workers)
+    uvicorn.run(service, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
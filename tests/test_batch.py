@@ -0,0 +1,36 @@
+import os
+import tempfile
+import unittest
+
+from batch import DONE, FAILED, convert_file
+from benchmarks.synthetic import make_footnoted_pdf
+
+
+class ConvertFileTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.pdf_path = os.path.join(cls.tmp.name, "circular.pdf")
+        make_footnoted_pdf(cls.pdf_path, pages=5)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def test_entry_records_the_last_progress_report(self):
+        entry = convert_file(self.pdf_path, os.path.join(self.tmp.name, "circular.csv"), "csv", pages="2-4")
+        self.assertEqual(entry["status"], DONE, entry.get("error"))
+        self.assertEqual(entry["pages"], 3)
+        self.assertEqual(entry["progress"]["pages_done"], 3)
+        self.assertEqual(entry["progress"]["page_count"], 3)
+        self.assertEqual(entry["progress"]["eta"], 0.0)
+
+    def test_failure_is_reported_not_raised(self):
+        entry = convert_file(os.path.join(self.tmp.name, "missing.pdf"), os.path.join(self.tmp.name, "missing.csv"),
+                             "csv")
+        self.assertEqual(entry["status"], FAILED)
+        self.assertNotIn("progress", entry)
+
+
+if __name__ == "__main__":
+    unittest.main()
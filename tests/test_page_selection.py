@@ -0,0 +1,84 @@
+import os
+import tempfile
+import unittest
+
+import fitz
+
+from benchmarks.synthetic import make_footnoted_pdf
+from PDFProcessor import PDFProcessor, page_label, select_pages
+
+LABEL_RULES = [
+    {"startpage": 0, "prefix": "", "firstpagenum": 1, "style": "r"},
+    {"startpage": 3, "prefix": "A-", "firstpagenum": 1, "style": "D"},
+    {"startpage": 6, "prefix": "", "firstpagenum": 1, "style": "a"},
+]
+
+
+class SelectPagesTest(unittest.TestCase):
+    def test_all_pages(self):
+        self.assertEqual(select_pages(None, 3), [0, 1, 2])
+
+    def test_ranges_are_sorted_and_deduplicated(self):
+        self.assertEqual(select_pages("8, 1-3, 2", 10), [0, 1, 2, 7])
+
+    def test_open_ended_ranges(self):
+        self.assertEqual(select_pages("9-", 10), [8, 9])
+        self.assertEqual(select_pages("-2", 10), [0, 1])
+
+    def test_iterable_of_numbers(self):
+        self.assertEqual(select_pages(range(3, 5), 10), [2, 3])
+
+    def test_invalid_selections(self):
+        for pages in ("0", "5-3", "11", "1-x", "", [0], [11], [1.5], ["2"]):
+            with self.subTest(pages=pages), self.assertRaises(ValueError):
+                select_pages(pages, 10)
+
+
+class PageLabelTest(unittest.TestCase):
+    def test_unlabelled_document_uses_page_numbers(self):
+        self.assertEqual(page_label([], 0), "1")
+        self.assertEqual(page_label([], 41), "42")
+
+    def test_label_rules(self):
+        labels = [page_label(LABEL_RULES, page_num) for page_num in range(8)]
+        self.assertEqual(labels, ["i", "ii", "iii", "A-1", "A-2", "A-3", "a", "b"])
+
+
+class PageMarkerTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.pdf_path = os.path.join(cls.tmp.name, "labelled.pdf")
+        make_footnoted_pdf(cls.pdf_path, pages=8)
+        doc = fitz.open(cls.pdf_path)
+        doc.set_page_labels(LABEL_RULES)
+        doc.saveIncr()
+        doc.close()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def markers(self, pages):
+        rows = PDFProcessor().iter_rows(self.pdf_path, page_markers=True, pages=pages)
+        return [(row.page, row.content) for row in rows if row.content.startswith("****")]
+
+    def test_markers_announce_the_next_selected_page(self):
+        self.assertEqual(self.markers("2, 5-6"), [
+            ("ii", "**** Page A-2 ****"),
+            ("A-2", "**** Page A-3 ****"),
+        ])
+
+    def test_last_document_page_is_followed_by_a_closing_marker(self):
+        self.assertEqual(self.markers("7-"), [
+            ("a", "**** Page b ****"),
+            ("b", "**** Page c ****"),
+        ])
+
+    def test_rows_are_tagged_with_their_page_label(self):
+        rows = list(PDFProcessor().iter_rows(self.pdf_path, pages=[1, 4]))
+        self.assertEqual({row.page for row in rows}, {"i", "A-1"})
+
+
+if __name__ == "__main__":
+    unittest.main()
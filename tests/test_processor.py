@@ -0,0 +1,166 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import fitz
+
+from benchmarks.synthetic import make_footnoted_pdf
+from PDFProcessor import MEMORY_RELIEF_INTERVAL, FootnoteRow, PDFProcessor, iter_rows, process_pdf_file
+from result_cache import PageCache
+
+
+class ProcessorTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.fixtures = tempfile.TemporaryDirectory()
+        cls.pdf_path = os.path.join(cls.fixtures.name, "circular.pdf")
+        make_footnoted_pdf(cls.pdf_path, pages=12)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.fixtures.cleanup()
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def copy_pdf(self, name):
+        path = os.path.join(self.tmp.name, name)
+        shutil.copyfile(self.pdf_path, path)
+        return path
+
+
+class FootnoteRowTest(unittest.TestCase):
+    def test_footnote_number_is_stripped(self):
+        row = FootnoteRow.from_excel_row("10", "", " 6. Inserted vide SEBI Circular")
+        self.assertEqual(row, FootnoteRow("10", "", "6", "Inserted vide SEBI Circular"))
+        self.assertEqual(row.to_excel_row(), ["", "6. Inserted vide SEBI Circular"])
+
+    def test_body_row(self):
+        row = FootnoteRow.from_excel_row("ii", "Body text 6", "")
+        self.assertEqual(row, FootnoteRow("ii", "Body text 6", "", ""))
+        self.assertEqual(row.to_excel_row(), ["Body text 6", ""])
+
+
+class OutputPathTest(ProcessorTest):
+    def test_default_output_path_for_uppercase_extension(self):
+        pdf_path = self.copy_pdf("REPORT.PDF")
+        for stream_output in (False, True):
+            with self.subTest(stream_output=stream_output):
+                output = process_pdf_file(pdf_path, stream_output=stream_output, output_format="csv")
+                self.assertEqual(output, os.path.join(self.tmp.name, "REPORT_Final.csv"))
+                self.assertTrue(os.path.getsize(output))
+                with open(pdf_path, "rb") as f:
+                    self.assertEqual(f.read(5), b"%PDF-")
+
+    def test_output_over_input_is_refused(self):
+        pdf_path = self.copy_pdf("circular.pdf")
+        size = os.path.getsize(pdf_path)
+        for stream_output in (False, True):
+            with self.subTest(stream_output=stream_output):
+                processor = PDFProcessor(stream_output=stream_output)
+                with self.assertRaises(ValueError):
+                    processor.process_pdf(pdf_path, pdf_path, "csv")
+                self.assertEqual(os.path.getsize(pdf_path), size)
+
+
+class ParallelTest(ProcessorTest):
+    def test_parallel_output_is_byte_identical(self):
+        for stream_output in (False, True):
+            with self.subTest(stream_output=stream_output):
+                outputs = []
+                for workers in (1, 4):
+                    output = os.path.join(self.tmp.name, f"workers{workers}.csv")
+                    PDFProcessor(workers=workers, stream_output=stream_output).process_pdf(self.pdf_path, output, "csv")
+                    with open(output, "rb") as f:
+                        outputs.append(f.read())
+                self.assertEqual(outputs[0], outputs[1])
+                self.assertIn(b"48. ", outputs[0])
+
+
+class PageCacheTest(ProcessorTest):
+    def test_second_run_reuses_every_page(self):
+        cache_dir = os.path.join(self.tmp.name, "pages")
+        cache = PageCache(cache_dir)
+        first = list(PDFProcessor(page_cache=cache).iter_rows(self.pdf_path))
+        self.assertEqual((cache.hits, cache.misses), (0, 12))
+
+        # A later upload of the same document, served from the cache on disk
+        cache = PageCache(cache_dir)
+        processor = PDFProcessor(page_cache=cache)
+        second = list(processor.iter_rows(self.pdf_path))
+        self.assertEqual((cache.hits, cache.misses), (12, 0))
+        self.assertEqual(processor.stats.counters["cached_pages"], 12)
+        self.assertEqual(second, first)
+        self.assertEqual(first, list(iter_rows(self.pdf_path)))
+
+
+class MemoryLimitTest(ProcessorTest):
+    def test_bounded_memory_rows_are_unchanged(self):
+        # Long enough for the RSS check to run twice; a 1 MB limit is always exceeded
+        pdf_path = os.path.join(self.tmp.name, "long.pdf")
+        make_footnoted_pdf(pdf_path, pages=2 * MEMORY_RELIEF_INTERVAL + 5)
+
+        processor = PDFProcessor(memory_limit_mb=1)
+        rows = list(processor.iter_rows(pdf_path))
+        self.assertEqual(processor.stats.counters["memory_reliefs"], 2)
+        self.assertGreater(processor.stats.peak_rss_mb, 0)
+        self.assertEqual(rows, list(iter_rows(pdf_path)))
+
+
+class ReferenceDetectionTest(ProcessorTest):
+    def test_small_digit_column_is_not_a_reference(self):
+        # An 8pt column of row numbers beside 11pt body text, each number on a line of its own
+        pdf_path = os.path.join(self.tmp.name, "table.pdf")
+        doc = fitz.open()
+        page = doc.new_page()
+        lines = ["The regulated entity shall comply with the provisions", "of this circular from the date of issue.",
+                 "Quarterly items shall be reported within thirty days", "of the end of each period.", "Note"]
+        for index, text in enumerate(lines):
+            page.insert_text((72, 72 + 16 * index), text, fontsize=11)
+            page.insert_text((460, 72 + 16 * index), str(index + 1), fontsize=8)
+        doc.save(pdf_path)
+        doc.close()
+
+        rows = list(iter_rows(pdf_path))
+        self.assertEqual([row for row in rows if row.footnote_number], [])
+        self.assertEqual(len(rows), 1)
+        for number in "12345":
+            self.assertIn(number, rows[0].content)
+
+    def test_superscript_references_are_found(self):
+        rows = list(iter_rows(self.pdf_path, pages="1"))
+        self.assertEqual([row.footnote_number for row in rows if row.footnote_number], ["1", "2", "3", "4"])
+
+    def test_each_reference_is_written_once(self):
+        # The footnote numbers at the foot of the page repeat the references' digits
+        rows = list(iter_rows(self.pdf_path))
+        numbers = [row.footnote_number for row in rows if row.footnote_number]
+        self.assertEqual(numbers, [str(number) for number in range(1, 49)])
+        for previous, row in zip(rows, rows[1:]):
+            if row.footnote_number:
+                self.assertTrue(previous.content.endswith(" " + row.footnote_number), previous)
+
+    def test_fallback_does_not_match_the_tail_of_a_longer_number(self):
+        # Footnote 1 is drawn as one span with its number, so only the regex fallback finds it
+        pdf_path = os.path.join(self.tmp.name, "fallback.pdf")
+        doc = fitz.open()
+        page = doc.new_page()
+        page.insert_text((72, 72), "Returns under clause 21 shall be filed quarterly.", fontsize=11)
+        text = "The entity shall comply with the provisions of this circular"
+        page.insert_text((72, 112), text, fontsize=11)
+        page.insert_text((72 + fitz.get_text_length(text, fontsize=11) + 1, 108), "1", fontsize=7)
+        page.insert_text((72, 700), "1 Inserted by the amending circular.", fontsize=8)
+        doc.save(pdf_path)
+        doc.close()
+
+        processor = PDFProcessor()
+        rows = list(processor.iter_rows(pdf_path))
+        self.assertEqual(processor.stats.counters["fallback_hits"], 1)
+        self.assertEqual([(row.footnote_number, row.footnote_text) for row in rows if row.footnote_number],
+                         [("1", "Inserted by the amending circular.")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+
+from benchmarks.synthetic import make_footnoted_pdf
+from service import PDFService, asgi_request
+
+
+class PDFServiceTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        pdf_path = os.path.join(cls.tmp.name, "circular.pdf")
+        make_footnoted_pdf(pdf_path, pages=3)
+        with open(pdf_path, "rb") as f:
+            cls.pdf = f.read()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def make_service(self, **kwargs):
+        work_dir = tempfile.mkdtemp(dir=self.tmp.name)
+        service = PDFService(workers=1, work_dir=work_dir, **kwargs)
+        self.addCleanup(service.shutdown)
+        return service
+
+    async def wait_for(self, service, job_id):
+        """Poll a job's status until it has finished and return it"""
+        for _ in range(600):
+            status, _, body = await asgi_request(service, "GET", f"/jobs/{job_id}")
+            self.assertEqual(status, 200)
+            job = json.loads(body)
+            if job["state"] in ("done", "failed"):
+                return job
+            await asyncio.sleep(0.05)
+        self.fail(f"Job {job_id} did not finish")
+
+    def test_submit_status_and_streamed_result(self):
+        service = self.make_service()
+
+        async def scenario():
+            status, _, body = await asgi_request(service, "POST", "/jobs?format=jsonl&pages=2-3", self.pdf)
+            self.assertEqual(status, 202)
+            job_id = json.loads(body)["id"]
+
+            job = await self.wait_for(service, job_id)
+            self.assertEqual(job["state"], "done", job["error"])
+            self.assertEqual(job["pages_done"], 2)
+            self.assertNotIn("pdf_path", job)
+
+            return await asgi_request(service, "GET", f"/jobs/{job_id}/result")
+
+        status, headers, body = asyncio.run(scenario())
+        self.assertEqual(status, 200)
+        self.assertEqual(headers["content-type"], "application/x-ndjson")
+        self.assertEqual(int(headers["content-length"]), len(body))
+        rows = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertTrue(rows)
+        self.assertEqual(set(rows[0]), {"Content", "Footnotes"})
+        self.assertTrue(any(row["Footnotes"] for row in rows))
+
+    def test_result_before_done_is_409(self):
+        service = self.make_service()
+
+        async def scenario():
+            _, _, body = await asgi_request(service, "POST", "/jobs", self.pdf)
+            job_id = json.loads(body)["id"]
+            early = await asgi_request(service, "GET", f"/jobs/{job_id}/result")
+            await self.wait_for(service, job_id)
+            return early
+
+        status, _, _ = asyncio.run(scenario())
+        self.assertEqual(status, 409)
+
+    def test_full_queue_is_429(self):
+        service = self.make_service(max_queue=0)
+
+        async def scenario():
+            first = await asgi_request(service, "POST", "/jobs", self.pdf)
+            second = await asgi_request(service, "POST", "/jobs", self.pdf)
+            await self.wait_for(service, json.loads(first[2])["id"])
+            # Capacity is released once the running job finishes
+            third = await asgi_request(service, "POST", "/jobs", self.pdf)
+            await self.wait_for(service, json.loads(third[2])["id"])
+            return first, second, third
+
+        first, second, third = asyncio.run(scenario())
+        self.assertEqual(first[0], 202)
+        self.assertEqual(second[0], 429)
+        self.assertIn("retry-after", second[1])
+        self.assertEqual(third[0], 202)
+
+    def test_pool_is_rebuilt_after_a_worker_dies(self):
+        service = self.make_service()
+
+        async def submit_and_wait():
+            _, _, body = await asgi_request(service, "POST", "/jobs", self.pdf)
+            return await self.wait_for(service, json.loads(body)["id"])
+
+        async def scenario():
+            await submit_and_wait()
+            for process in list(service.executor._processes.values()):
+                process.kill()
+            # The job that meets the broken pool may fail, but the service must recover after it
+            await submit_and_wait()
+            return await submit_and_wait()
+
+        job = asyncio.run(scenario())
+        self.assertEqual(job["state"], "done", job["error"])
+
+    def test_oversized_upload_is_413(self):
+        service = self.make_service(max_upload_bytes=1024)
+
+        status, _, _ = asyncio.run(asgi_request(service, "POST", "/jobs", self.pdf))
+        self.assertEqual(status, 413)
+        self.assertEqual(service.in_flight, 0)
+        self.assertEqual(os.listdir(service.work_dir), [])
+
+    def test_unknown_format_is_400(self):
+        service = self.make_service()
+
+        status, _, body = asyncio.run(asgi_request(service, "POST", "/jobs?format=docx", self.pdf))
+        self.assertEqual(status, 400)
+        self.assertIn("docx", json.loads(body)["error"])
+
+    def test_wrong_method_is_405(self):
+        service = self.make_service()
+
+        status, headers, _ = asyncio.run(asgi_request(service, "GET", "/jobs"))
+        self.assertEqual(status, 405)
+        self.assertEqual(headers["allow"], "POST")
+
+
+if __name__ == "__main__":
+    unittest.main()
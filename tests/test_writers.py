@@ -0,0 +1,91 @@
+import csv
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from openpyxl import load_workbook
+
+from writers import COLUMNS, SHEET_NAME, WRITERS, get_writer
+
+ROWS = [
+    ["First paragraph, with a comma", ""],
+    ["Body text with a reference", "1. Footnote text — with unicode"],
+    ["**** Page 2 ****", ""],
+]
+
+
+def read_back(output_format, path):
+    """Rows of an output file as [[content, footnote], ...], header excluded"""
+    if output_format == "xlsx":
+        sheet = load_workbook(path)[SHEET_NAME]
+        return [[cell or "" for cell in row] for row in sheet.iter_rows(min_row=2, values_only=True)]
+    if output_format == "csv":
+        with open(path, encoding="utf-8", newline="") as f:
+            rows = list(csv.reader(f))
+        assert rows[0] == COLUMNS
+        return rows[1:]
+    if output_format == "jsonl":
+        with open(path, encoding="utf-8") as f:
+            return [[record[name] for name in COLUMNS] for record in map(json.loads, f)]
+    if output_format == "parquet":
+        import pyarrow.parquet as pq
+        table = pq.read_table(path)
+        return [list(row) for row in zip(*(table.column(name).to_pylist() for name in COLUMNS))]
+    raise ValueError(output_format)
+
+
+class WritersTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def writer_or_skip(self, output_format):
+        if output_format == "parquet":
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                self.skipTest("pyarrow is not installed")
+        return WRITERS[output_format]
+
+    def test_round_trip(self):
+        for output_format in WRITERS:
+            with self.subTest(output_format=output_format):
+                writer_class = self.writer_or_skip(output_format)
+                path = os.path.join(self.tmp.name, "out" + writer_class.extension)
+                with writer_class(path) as writer:
+                    writer.write_rows(ROWS)
+                self.assertEqual(writer.row_count, len(ROWS))
+                self.assertEqual(read_back(output_format, path), ROWS)
+
+    def test_file_object_output_is_left_open(self):
+        for output_format in ("xlsx", "csv", "jsonl"):
+            with self.subTest(output_format=output_format):
+                buffer = io.BytesIO()
+                with WRITERS[output_format](buffer) as writer:
+                    writer.write_rows(ROWS)
+                self.assertFalse(buffer.closed)
+                path = os.path.join(self.tmp.name, "buffer" + writer.extension)
+                with open(path, "wb") as f:
+                    f.write(buffer.getvalue())
+                self.assertEqual(read_back(output_format, path), ROWS)
+
+    def test_failed_write_removes_partial_file(self):
+        for output_format in ("csv", "jsonl", "parquet"):
+            with self.subTest(output_format=output_format):
+                writer_class = self.writer_or_skip(output_format)
+                path = os.path.join(self.tmp.name, "partial" + writer_class.extension)
+                with self.assertRaises(RuntimeError), writer_class(path) as writer:
+                    writer.write_rows(ROWS)
+                    raise RuntimeError("processing failed")
+                self.assertFalse(os.path.exists(path))
+
+    def test_get_writer(self):
+        self.assertIs(get_writer("csv"), WRITERS["csv"])
+        with self.assertRaises(ValueError):
+            get_writer("docx")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,227 @@
+"""Streaming output writers for processed PDF rows
+
+Every writer takes an output path (or binary file object) and exposes
+write_row / write_rows, close() to finish the file and discard() to abandon
+it. WRITERS maps an output format name to its writer class.
+"""
+
+import csv
+import io
+import json
+import os
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, NamedStyle, Side
+
+SHEET_NAME = 'Processed Content'
+COLUMNS = ['Content', 'Footnotes']
+
+
+class RowWriter:
+    """Shared behaviour of the output writers; subclasses implement write_row, close and discard"""
+
+    extension = None
+
+    def write_rows(self, rows):
+        for content, footnote in rows:
+            self.write_row(content, footnote)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+
+class ExcelRowWriter(RowWriter):
+    """Write [Content, Footnotes] rows to a write-only workbook as they are produced
+
+    Rows are serialized straight to disk, so memory stays flat regardless of
+    how many rows the document yields. Cell formatting uses shared named
+    styles instead of per-cell style objects.
+    """
+
+    extension = '.xlsx'
+
+    def __init__(self, output_path):
+        # A filesystem path or a binary file object such as io.BytesIO
+        self.output_path = output_path
+        self.row_count = 0
+
+        self.workbook = Workbook(write_only=True)
+        self._register_styles()
+        self.sheet = self.workbook.create_sheet(SHEET_NAME)
+
+        # Column widths must be set before the first row is written
+        self.sheet.column_dimensions['A'].width = 60
+        self.sheet.column_dimensions['B'].width = 40
+
+        self.sheet.append([self._cell(name, 'header') for name in COLUMNS])
+
+    def _register_styles(self):
+        thin = Side(style='thin')
+        styles = [
+            NamedStyle(name='header',
+                       font=Font(bold=True),
+                       border=Border(left=thin, right=thin, top=thin, bottom=thin),
+                       alignment=Alignment(horizontal='center', vertical='top')),
+            NamedStyle(name='content',
+                       alignment=Alignment(wrap_text=True, vertical='top', horizontal='left')),
+            NamedStyle(name='page_marker',
+                       font=Font(bold=True),
+                       alignment=Alignment(horizontal='center')),
+            NamedStyle(name='footnote',
+                       font=Font(italic=True),
+                       alignment=Alignment(wrap_text=True, vertical='top', horizontal='left')),
+        ]
+        for style in styles:
+            self.workbook.add_named_style(style)
+
+    def _cell(self, value, style):
+        cell = WriteOnlyCell(self.sheet, value=value if value != "" else None)
+        cell.style = style
+        return cell
+
+    def write_row(self, content, footnote):
+        """Append a single [Content, Footnotes] row"""
+        is_page_marker = isinstance(content, str) and content.startswith('****')
+        self.sheet.append([
+            self._cell(content, 'page_marker' if is_page_marker else 'content'),
+            self._cell(footnote, 'footnote' if footnote else 'content'),
+        ])
+        self.row_count += 1
+
+    def close(self):
+        self.workbook.save(self.output_path)
+        return self.output_path
+
+    def discard(self):
+        """Abandon the workbook without writing output, releasing its temp file"""
+        self.sheet.close()
+        if self.sheet._writer is not None:
+            self.sheet._writer.cleanup()
+
+
+class _TextRowWriter(RowWriter):
+    """Base for plain-text formats written line by line to a path or binary file object"""
+
+    def __init__(self, output_path):
+        self.output_path = output_path
+        self.row_count = 0
+        if isinstance(output_path, str):
+            self.file = open(output_path, 'w', encoding='utf-8', newline='')
+        else:
+            self.file = io.TextIOWrapper(output_path, encoding='utf-8', newline='')
+
+    def close(self):
+        if isinstance(self.output_path, str):
+            self.file.close()
+        else:
+            # Leave the caller's file object open
+            self.file.flush()
+            self.file.detach()
+        return self.output_path
+
+    def discard(self):
+        """Abandon the output, removing a partially written file"""
+        if isinstance(self.output_path, str):
+            self.file.close()
+            if os.path.exists(self.output_path):
+                os.remove(self.output_path)
+        else:
+            self.file.detach()
+
+
+class CsvRowWriter(_TextRowWriter):
+    """Write rows as UTF-8 CSV with a Content,Footnotes header"""
+
+    extension = '.csv'
+
+    def __init__(self, output_path):
+        super().__init__(output_path)
+        self.csv = csv.writer(self.file)
+        self.csv.writerow(COLUMNS)
+
+    def write_row(self, content, footnote):
+        self.csv.writerow((content, footnote))
+        self.row_count += 1
+
+
+class JsonlRowWriter(_TextRowWriter):
+    """Write one JSON object per row, keyed by column name"""
+
+    extension = '.jsonl'
+
+    def write_row(self, content, footnote):
+        self.file.write(json.dumps({COLUMNS[0]: content, COLUMNS[1]: footnote}, ensure_ascii=False))
+        self.file.write('\n')
+        self.row_count += 1
+
+
+class ParquetRowWriter(RowWriter):
+    """Write rows to a two-column string Parquet file, one row group per batch of rows
+
+    Needs pyarrow, which is imported on first use so the other formats don't
+    pay for it.
+    """
+
+    extension = '.parquet'
+    batch_size = 50_000
+
+    def __init__(self, output_path):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.output_path = output_path
+        self.row_count = 0
+        self._pa = pa
+        self.schema = pa.schema([(name, pa.string()) for name in COLUMNS])
+        self.writer = pq.ParquetWriter(output_path, self.schema)
+        self.contents = []
+        self.footnotes = []
+
+    def write_row(self, content, footnote):
+        self.contents.append(content)
+        self.footnotes.append(footnote)
+        self.row_count += 1
+        if len(self.contents) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        if self.contents:
+            batch = self._pa.record_batch([self.contents, self.footnotes], schema=self.schema)
+            self.writer.write_batch(batch)
+            self.contents = []
+            self.footnotes = []
+
+    def close(self):
+        self._flush()
+        self.writer.close()
+        return self.output_path
+
+    def discard(self):
+        """Abandon the output, removing a partially written file"""
+        self.writer.close()
+        if isinstance(self.output_path, str) and os.path.exists(self.output_path):
+            os.remove(self.output_path)
+
+
+WRITERS = {
+    'xlsx': ExcelRowWriter,
+    'csv': CsvRowWriter,
+    'jsonl': JsonlRowWriter,
+    'parquet': ParquetRowWriter,
+}
+
+
+def get_writer(output_format):
+    """Writer class for an output format name such as 'xlsx' or 'csv'"""
+    try:
+        return WRITERS[output_format]
+    except KeyError:
+        raise ValueError(f"Unknown output format {output_format!r}, "
+                         f"expected one of {', '.join(WRITERS)}") from None